@@ -1,15 +1,119 @@
 # cogs/admin.py
 import discord
 from discord.ext import commands
-from utils.db_handler import DatabaseHandler
+from utils.db_handler import get_db
 import config
 from typing import Optional
 from datetime import datetime, timedelta
 
+# SQL used by the admin commands. Kept as constants so the text is identical
+# on every call and sqlite3's per-connection statement cache is always hit.
+SQL_UPSERT_TOTAL = '''
+    INSERT INTO users (user_id, username, total_success)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        total_success = ?
+'''
+
+SQL_UPSERT_ADD = '''
+    INSERT INTO users (user_id, username, total_success)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        total_success = COALESCE(total_success, 0) + ?
+'''
+
+SQL_DEC_POINTS = '''
+    UPDATE users
+    SET total_success = MAX(0, COALESCE(total_success, 0) - ?)
+    WHERE user_id = ?
+    RETURNING total_success
+'''
+
+SQL_INSERT_USER = '''
+    INSERT OR IGNORE INTO users (user_id, username, total_success)
+    VALUES (?, ?, 0)
+'''
+
+SQL_UPSERT_STREAK = '''
+    INSERT INTO users (user_id, username, success_streak, has_reroll_ability)
+    VALUES (?, ?, ?, CASE WHEN ? >= 7 THEN 1 ELSE 0 END)
+    ON CONFLICT(user_id) DO UPDATE SET
+        success_streak = excluded.success_streak,
+        has_reroll_ability = MAX(COALESCE(has_reroll_ability, 0), excluded.has_reroll_ability)
+'''
+
+SQL_UPSERT_REROLL = '''
+    INSERT INTO users (user_id, username, has_reroll_ability)
+    VALUES (?, ?, 1)
+    ON CONFLICT(user_id) DO UPDATE SET
+        has_reroll_ability = 1
+'''
+
+SQL_RESET_STATS_USER = '''
+    UPDATE users
+    SET total_success = 0,
+        success_streak = 0,
+        has_reroll_ability = 0
+    WHERE user_id = ?
+'''
+
+SQL_RESET_STATS_USAGE = '''
+    DELETE FROM command_usage
+    WHERE user_id = ? AND command_name = 'успех'
+'''
+
+SQL_RESET_STATS_REROLLS = '''
+    DELETE FROM command_rerolls
+    WHERE user_id = ?
+'''
+
+# Synchronous query helpers, run in a worker thread via DatabaseHandler.run
+# on that thread's pooled connection
+def _set_points(db, user_id: int, username: str, points: int) -> None:
+    with db.get_connection() as conn:
+        conn.execute(SQL_UPSERT_TOTAL, (user_id, username, points, points))
+
+def _add_points(db, user_id: int, username: str, points: int) -> None:
+    with db.get_connection() as conn:
+        conn.execute(SQL_UPSERT_ADD, (user_id, username, points, points))
+
+def _remove_points(db, user_id: int, username: str, points: int) -> int:
+    with db.get_connection() as conn:
+        # Decrement in a single statement, clamped at 0 (requires SQLite >= 3.35)
+        result = conn.execute(SQL_DEC_POINTS, (points, user_id)).fetchone()
+        
+        if result is None:
+            # Unknown user, create the record with no points
+            conn.execute(SQL_INSERT_USER, (user_id, username))
+            return 0
+        return result['total_success']
+
+def _set_streak(db, user_id: int, username: str, streak: int) -> None:
+    # A streak of 7+ also grants the reroll ability
+    with db.get_connection() as conn:
+        conn.execute(SQL_UPSERT_STREAK, (user_id, username, streak, streak))
+
+def _give_reroll(db, user_id: int, username: str) -> None:
+    with db.get_connection() as conn:
+        conn.execute(SQL_UPSERT_REROLL, (user_id, username))
+
+def _reset_stats(db, user_id: int) -> None:
+    # Reset stats and clean up history in a single transaction
+    with db.get_connection() as conn:
+        conn.execute(SQL_RESET_STATS_USER, (user_id,))
+        conn.execute(SQL_RESET_STATS_USAGE, (user_id,))
+        conn.execute(SQL_RESET_STATS_REROLLS, (user_id,))
+
 class Admin(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = DatabaseHandler()  # Initialize database handler
+        self.db = get_db()  # Shared with Fun and Moderation
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drop the Fun cog's cached data for a user whose stats were just edited"""
+        fun = self.bot.get_cog('Fun')
+        if fun is not None:
+            fun.invalidate_user(user_id)
 
     @commands.command(name="reload", description="[ADMIN] Reload a specific cog")
     @commands.is_owner()
@@ -39,18 +143,8 @@ class Admin(commands.Cog):
     async def set_points(self, ctx, user: discord.Member, points: int):
         """Set a user's total success points"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO users (user_id, username, total_success)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    total_success = ?
-            ''', (user.id, user.name, points, points))
-            
-            conn.commit()
-            conn.close()
+            await self.db.run(_set_points, self.db, user.id, user.name, points)
+            self.invalidate_user(user.id)
             
             await ctx.send(f"✅ Set {user.mention}'s success points to {points}")
         except Exception as e:
@@ -64,18 +158,8 @@ class Admin(commands.Cog):
     async def add_points(self, ctx, user: discord.Member, points: int):
         """Add success points to a user"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO users (user_id, username, total_success)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    total_success = COALESCE(total_success, 0) + ?
-            ''', (user.id, user.name, points, points))
-            
-            conn.commit()
-            conn.close()
+            await self.db.run(_add_points, self.db, user.id, user.name, points)
+            self.invalidate_user(user.id)
             
             await ctx.send(f"✅ Added {points} success points to {user.mention}")
         except Exception as e:
@@ -89,36 +173,13 @@ class Admin(commands.Cog):
     async def remove_points(self, ctx, user: discord.Member, points: int):
         """Remove success points from a user"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            # Get current points
-            cursor.execute('''
-                SELECT total_success 
-                FROM users 
-                WHERE user_id = ?
-            ''', (user.id,))
-            
-            result = cursor.fetchone()
-            current_points = result['total_success'] if result else 0
+            new_points = await self.db.run(_remove_points, self.db, user.id, user.name, points)
+            self.invalidate_user(user.id)
             
-            # Calculate new points (don't go below 0)
-            new_points = max(0, current_points - points)
-            
-            # Update points
-            cursor.execute('''
-                INSERT INTO users (user_id, username, total_success)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    total_success = ?
-            ''', (user.id, user.name, new_points, new_points))
-            
-            conn.commit()
-            conn.close()
-            
-            # Calculate actual points removed
-            points_removed = current_points - new_points
-            await ctx.send(f"✅ Removed {points_removed} success points from {user.mention}. New total: {new_points}")
+            if new_points > 0:
+                await ctx.send(f"✅ Removed {points} success points from {user.mention}. New total: {new_points}")
+            else:
+                await ctx.send(f"✅ Removed all success points from {user.mention}. New total: 0")
             
         except Exception as e:
             print(f"Error in remove_points: {str(e)}")
@@ -132,31 +193,14 @@ class Admin(commands.Cog):
     async def set_streak(self, ctx, user: discord.Member, streak: int):
         """Set a user's success streak"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
+            await self.db.run(_set_streak, self.db, user.id, user.name, streak)
+            self.invalidate_user(user.id)
             
-            cursor.execute('''
-                INSERT INTO users (user_id, username, success_streak)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    success_streak = ?
-            ''', (user.id, user.name, streak, streak))
-            
-            conn.commit()
-            
-            # If streak >= 7, also grant reroll ability
             if streak >= 7:
-                cursor.execute('''
-                    UPDATE users
-                    SET has_reroll_ability = 1
-                    WHERE user_id = ?
-                ''', (user.id,))
-                conn.commit()
                 await ctx.send(f"✅ Set {user.mention}'s streak to {streak} and granted reroll ability")
             else:
                 await ctx.send(f"✅ Set {user.mention}'s streak to {streak}")
                 
-            conn.close()
         except Exception as e:
             await ctx.send(f"❌ Error setting streak: {str(e)}")
 
@@ -168,18 +212,8 @@ class Admin(commands.Cog):
     async def give_reroll(self, ctx, user: discord.Member):
         """Give reroll ability to a user"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO users (user_id, username, has_reroll_ability)
-                VALUES (?, ?, 1)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    has_reroll_ability = 1
-            ''', (user.id, user.name))
-            
-            conn.commit()
-            conn.close()
+            await self.db.run(_give_reroll, self.db, user.id, user.name)
+            self.invalidate_user(user.id)
             
             await ctx.send(f"✅ Gave reroll ability to {user.mention}")
         except Exception as e:
@@ -193,32 +227,8 @@ class Admin(commands.Cog):
     async def reset_stats(self, ctx, user: discord.Member):
         """Reset all success-related stats for a user"""
         try:
-            conn = self.db.get_connection()
-            cursor = conn.cursor()
-            
-            # Reset all success-related fields
-            cursor.execute('''
-                UPDATE users
-                SET total_success = 0,
-                    success_streak = 0,
-                    has_reroll_ability = 0
-                WHERE user_id = ?
-            ''', (user.id,))
-            
-            # Clean up command usage history
-            cursor.execute('''
-                DELETE FROM command_usage
-                WHERE user_id = ? AND command_name = 'успех'
-            ''', (user.id,))
-            
-            # Clean up reroll tracking
-            cursor.execute('''
-                DELETE FROM command_rerolls
-                WHERE user_id = ?
-            ''', (user.id,))
-            
-            conn.commit()
-            conn.close()
+            await self.db.run(_reset_stats, self.db, user.id)
+            self.invalidate_user(user.id)
             
             await ctx.send(f"✅ Reset all success stats for {user.mention}")
         except Exception as e:
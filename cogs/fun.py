@@ -1,70 +1,262 @@
 # cogs/fun.py
 import discord
 from discord.ext import commands
-from discord.ui import View, Button
 from utils.helpers import create_embed
-from utils.db_handler import DatabaseHandler
+from utils.db_handler import get_db
 from utils.rng import RandomOrgRNG
-from datetime import datetime, timedelta
+from utils.cache import TTLCache
+from utils.batch_writer import BatchWriter
+from datetime import datetime, timezone
 import logging
-import random
+import asyncio
 import os
+import time
+from bisect import bisect_right
+from typing import Dict, Optional, Tuple
 
+# Embed colors, resolved once instead of on every reply
+_RED = discord.Color.red().value
+_GOLD = discord.Color.gold().value
+
+# Roll thresholds between success levels, and the result for each band
+SUCCESS_THRESHOLDS = (5, 10, 50, 75, 90)
+SUCCESS_LEVELS = (
+    ("📉 Massive anti-success", 1),
+    ("🗑️ garbage success", 2),
+    ("❌ is not successful today", 3),
+    ("📈 is somewhat successful today", 4),
+    ("💰 is very successful today", 5),
+    ("🌟 IS A MASSIVE SUCCESSFUL BUSINESSMAN", 6),
+)
+
+def _success_for(number: int) -> tuple[str, int]:
+    """Map a 1-100 roll to its success message and level"""
+    return SUCCESS_LEVELS[bisect_right(SUCCESS_THRESHOLDS, number)]
+
+# Success result for every possible roll, indexed by number - 1
+SUCCESS_TABLE = tuple(_success_for(number) for number in range(1, 101))
+
+# How often a user may run !успех, in seconds
+SUCCESS_COOLDOWN_SECONDS = 12 * 3600
+
+# !roll usage rows are written in batches of up to this many, at most this often
+USAGE_FLUSH_BATCH = 500
+USAGE_FLUSH_INTERVAL = 0.5
+
+# Leaderboard progress bars for 0-8 filled segments
+_BARS = tuple("▰" * filled + "▱" * (8 - filled) for filled in range(9))
+
+# Business rank by minimum total success, highest first
+BUSINESS_TIERS = (
+    (1000, "💎 Business Legend"),
+    (500, "👑 Business Mogul"),
+    (250, "💼 Business Expert"),
+    (100, "📈 Rising Star"),
+    (0, "👔 Beginner"),
+)
+
+def business_tier(total_success: int) -> str:
+    """Get the business rank name for a total success score"""
+    return next((name for threshold, name in BUSINESS_TIERS if total_success >= threshold), BUSINESS_TIERS[-1][1])
+
+# Canned replies for !logitech and !razer
+_LOGITECH_MSG = "i was asking about why to get razer when they copied logitech. that was all i wanted to know, theres no basis on anything said expect for ""its better"", but sure if 7ms is worth it for shitty QA and having to rma it in 3 months then go ahead. atleast with logitech you can upgrade to the powerplay and have the mouse charge while you play so you never have to worry about it.  "
+_RAZER_MSG = "razer lost my trust when all i hear are issues online and that they just use gamer marketing to get people buying. like their razer switches which are just different coloured kailh switches"
 
 class Fun(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = DatabaseHandler()
+        self.db = get_db()  # Queries run in worker threads, off the event loop
         api_key = os.getenv('RANDOM_ORG_KEY')
         if not api_key:
             raise ValueError("RANDOM_ORG_KEY not found in environment variables")
         self.rng = RandomOrgRNG(api_key)
+        
+        # Read-mostly data cached in memory
+        self.reroll_ability_cache = TTLCache(maxsize=10_000, ttl=300)
+        self.leaderboard_cache = TTLCache(maxsize=1, ttl=60)
+        self._leaderboard_lock = asyncio.Lock()
+        self._leaderboard_embed: Tuple[Optional[list], Optional[discord.Embed]] = (None, None)
+        
+        self._stats_cache = TTLCache(maxsize=1024, ttl=30)
+        
+        # In-flight !успехстат queries, so concurrent requests for one user share a query
+        self._stats_inflight: Dict[int, asyncio.Task] = {}
+        
+        # Latest успех execution time and whether it was rerolled, per user,
+        # so !reroll can skip the database for rolls made since the cog loaded
+        self.active_checks: Dict[int, Tuple[datetime, bool]] = {}
+        
+        # When each user may use !успех again; the database is consulted only on a miss
+        self._next_available = TTLCache(maxsize=100_000, ttl=SUCCESS_COOLDOWN_SECONDS)
+        
+        # !roll usage rows, written in the background in batches
+        self._usage_writer = BatchWriter(self.db, self.db.log_command_usages, "usage log",
+                                         batch_size=USAGE_FLUSH_BATCH, interval=USAGE_FLUSH_INTERVAL)
+        
+        # Only the description of the cooldown notice changes between sends
+        self._cooldown_embed_base = create_embed(
+            title="Command on Cooldown ⏳",
+            color=_RED
+        )
+
+    async def cog_load(self):
+        """Start writing queued usage logs in the background"""
+        self._usage_writer.start()
 
     async def cog_unload(self):
         """Cleanup when cog is unloaded"""
+        await self._usage_writer.close()
         await self.rng.close()
 
-    async def process_success_roll(self, number: int) -> tuple[str, int]:
+    def log_command_usage(self, user_id: int, command_name: str,
+                          success_level: Optional[int] = None,
+                          roll_value: Optional[int] = None) -> None:
+        """Queue a command usage row for the background flusher"""
+        used_at = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())  # Same format as CURRENT_TIMESTAMP
+        if not self._usage_writer.put((user_id, command_name, success_level, roll_value, used_at)):
+            logging.warning("Usage log queue full, dropping %s usage for %s", command_name, user_id)
+
+    async def has_reroll_ability(self, user_id: int) -> bool:
+        """Check if user has the reroll ability, using the cache when possible"""
+        cached = self.reroll_ability_cache.get(user_id)
+        if cached is None:
+            cached = await self.db.run(self.db.has_reroll_ability, user_id)
+            self.reroll_ability_cache.set(user_id, cached)
+        return cached
+
+    async def get_success_leaderboard(self):
+        """Get the успех leaderboard, refilling the cache at most once at a time"""
+        cached = self.leaderboard_cache.get('top')
+        if cached is None:
+            async with self._leaderboard_lock:
+                cached = self.leaderboard_cache.get('top')
+                if cached is None:
+                    cached = await self.db.run(self.db.get_success_leaderboard)
+                    self.leaderboard_cache.set('top', cached)
+        return cached
+
+    async def get_success_stats(self, user_id: int):
+        """Get a user's success stats from the cache, or join or start a query for them"""
+        cached = self._stats_cache.get(user_id)
+        if cached is not None:
+            return cached
+        task = self._stats_inflight.get(user_id)
+        if task is None:
+            task = asyncio.create_task(self._load_success_stats(user_id))
+            self._stats_inflight[user_id] = task
+            task.add_done_callback(lambda done: self._forget_stats_task(user_id, done))
+        # Shielded so one caller being cancelled doesn't cancel the query for the others
+        return await asyncio.shield(task)
+
+    async def _load_success_stats(self, user_id: int):
+        """Query a user's success stats, caching them unless invalidated meanwhile"""
+        stats = await self.db.run(self.db.get_success_stats, user_id)
+        if self._stats_inflight.get(user_id) is asyncio.current_task():
+            self._stats_cache.set(user_id, stats)
+        return stats
+
+    def _forget_stats_task(self, user_id: int, task: asyncio.Task) -> None:
+        """Drop a finished stats query, unless a newer one has replaced it"""
+        if self._stats_inflight.get(user_id) is task:
+            del self._stats_inflight[user_id]
+
+    def invalidate_success_stats(self, user_id: int) -> None:
+        """Forget cached or in-flight stats for a user after their success data changes"""
+        self._stats_cache.pop(user_id)
+        self._stats_inflight.pop(user_id, None)
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Forget everything cached about a user after their data is changed outside this cog"""
+        self.reroll_ability_cache.pop(user_id)
+        self.invalidate_success_stats(user_id)
+        self.active_checks.pop(user_id, None)
+        self.leaderboard_cache.clear()
+
+    def build_leaderboard_embed(self, leaderboard_data) -> discord.Embed:
+        """Render the успех leaderboard, reusing the last embed while its rows are still cached"""
+        built_from, embed = self._leaderboard_embed
+        if built_from is leaderboard_data:
+            return embed
+
+        embed = create_embed(
+            title="🏆 Business Empire Leaderboard 🏆",
+            description="The most successful businessmen:",
+            color=_GOLD
+        )
+
+        # Rows are sorted by total success, so the first one holds the maximum
+        max_success = leaderboard_data[0]['total_success']
+
+        # Format leaderboard entries (the query already defaults NULL aggregates to 0)
+        for i, entry in enumerate(leaderboard_data, 1):
+            total_success = entry['total_success']
+            success_streak = entry['success_streak']
+            has_reroll = entry['has_reroll_ability']
+            highest_success = entry['highest_success']
+            avg_success = entry['avg_success']
+            total_attempts = entry['total_attempts']
+            username = entry['username'] or 'Unknown User'
+
+            # Determine medal and rank formatting
+            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "👔"
+            
+            # Calculate success bar (protect against division by zero)
+            progress = min(1.0, max(0.0, total_success / max_success)) if max_success > 0 else 0
+            bar = _BARS[int(8 * progress)]
+
+            # Format achievements
+            achievements = []
+            if has_reroll:
+                achievements.append("🎲 Reroll Master")
+            if success_streak >= 7:
+                achievements.append(f"🔥 {success_streak}d Streak")
+            if highest_success == 6:
+                achievements.append("⭐ Perfect Roll")
+
+            # Format the entry text
+            value = (
+                f"{bar} **{total_success}** pts\n"
+                f"Rank: {business_tier(total_success)}\n"
+                f"Avg Success: {avg_success:.1f} ({total_attempts} attempts)"
+                + (f"\nAchievements: {' '.join(achievements)}" if achievements else "")
+            )
+
+            embed.add_field(
+                name=f"{medal} #{i} {username}",
+                value=value,
+                inline=False
+            )
+
+        self._leaderboard_embed = (leaderboard_data, embed)
+        return embed
+
+    def process_success_roll(self, number: int) -> tuple[str, int]:
         """Process a success roll and return the message and success level"""
-        if number < 5:
-            return "📉 Massive anti-success", 1
-        elif number < 10:
-            return "🗑️ garbage success", 2
-        elif number < 50:
-            return "❌ is not successful today", 3
-        elif number < 75:
-            return "📈 is somewhat successful today", 4
-        elif number < 90:
-            return "💰 is very successful today", 5
-        else:
-            return "🌟 IS A MASSIVE SUCCESSFUL BUSINESSMAN", 6
-
-    async def handle_success_roll(self, ctx, interaction=None) -> tuple[str, int]:
+        return SUCCESS_TABLE[number - 1]
+
+    async def handle_success_roll(self, ctx, interaction=None, update_cooldown: bool = False) -> tuple[str, int]:
         """Handle the success roll logic"""
         try:
             number = await self.rng.randint(1, 100)
-            mention = ctx.author.mention    
             # Log the roll result
-            logging.info(f"Success roll for {ctx.author.name}#{ctx.author.discriminator} (ID: {ctx.author.id}): {number}")
+            logging.info("Success roll for %s (ID: %s): %s", ctx.author.name, ctx.author.id, number)
             
-            message_part, success_level = await self.process_success_roll(number)
+            message_part, success_level = self.process_success_roll(number)
             
             user = interaction.user if interaction else ctx.author
             message = f"{user.mention} {message_part}"
             
-            # Update database
-            self.db.log_command_usage(user.id, "успех", success_level=success_level)
-            self.db.update_total_success(user.id, success_level)
-            
-            # Update streak and get streak info
-            streak_info = self.db.update_success_streak(user.id)
+            # Log the roll, update total, streak and cooldown in one transaction
+            streak_info = await self.db.run(self.db.record_success_roll, user.id, success_level, update_cooldown)
+            self.reroll_ability_cache.set(user.id, streak_info['has_reroll_ability'])
+            self.invalidate_success_stats(user.id)
             
             if streak_info['streak_continued']:
                 message += f"\n🔥 Streak continued! Current streak: {streak_info['current_streak']} days"
                 
-                # Unlock reroll ability at 7 day streak
-                if streak_info['current_streak'] == 7:
-                    self.db.unlock_reroll_ability(user.id)
+                # Reroll ability is unlocked at a 7 day streak
+                if streak_info['reroll_unlocked']:
                     message += "\n🎁 Congratulations! You've unlocked the reroll ability!"
                     
             elif streak_info['streak_reset']:
@@ -72,7 +264,7 @@ class Fun(commands.Cog):
                 
             return message, success_level
         except Exception as e:
-            logging.error(f"Error processing success roll: {str(e)}")
+            logging.error("Error processing success roll: %s", e)
             raise
 
     @commands.hybrid_command(name="успех", description="See how successful you are today using true randomness (once per 12h)")
@@ -81,36 +273,32 @@ class Fun(commands.Cog):
         await ctx.defer()
         
         user_id = ctx.author.id
-        current_time = datetime.now()
-        
-        # Update user record
-        self.db.update_user(user_id, ctx.author.name)
+        now = int(time.time())
         
-        # Check cooldown
-        last_used = self.db.get_command_cooldown(user_id, "успех")
-        if last_used:
-            next_available = last_used + timedelta(hours=12)
-            if current_time < next_available:
-                time_remaining = next_available - current_time
-                hours = int(time_remaining.total_seconds() // 3600)
-                minutes = int((time_remaining.total_seconds() % 3600) // 60)
-                
-                embed = create_embed(
-                    title="Command on Cooldown ⏳",
-                    description=f"You can check your success again in {hours} hours and {minutes} minutes.",
-                    color=discord.Color.red().value
-                )
-                await ctx.send(embed=embed)
-                return
+        # Check cooldown (epoch seconds), from memory when possible
+        next_available = self._next_available.get(user_id)
+        if next_available is None:
+            last_used = await self.db.run(self.db.get_command_cooldown_epoch, user_id, "успех")
+            if last_used is not None:
+                next_available = last_used + SUCCESS_COOLDOWN_SECONDS
+                self._next_available.set(user_id, next_available)
+        remaining = next_available - now if next_available else 0
+        if remaining > 0:
+            hours, remainder = divmod(remaining, 3600)
+            minutes = remainder // 60
+            
+            embed = self._cooldown_embed_base.copy()
+            embed.description = f"You can check your success again in {hours} hours and {minutes} minutes."
+            await ctx.send(embed=embed)
+            return
 
         try:
-            # Record exact execution time
-            execution_time = self.db.record_command_execution(user_id, "успех")
+            # Update the user record and the exact execution time in one transaction
+            execution_time = await self.db.run(self.db.record_user_execution, user_id, ctx.author.name, "успех")
+            self.active_checks[user_id] = (execution_time, False)
             
-            message, success_level = await self.handle_success_roll(ctx)
-            
-            # Update cooldown
-            self.db.update_command_cooldown(user_id, "успех")
+            message, success_level = await self.handle_success_roll(ctx, update_cooldown=True)
+            self._next_available.set(user_id, now + SUCCESS_COOLDOWN_SECONDS)
             await ctx.send(message)
             
         except Exception as e:
@@ -123,65 +311,56 @@ class Fun(commands.Cog):
         
         try:
             # Check if user has reroll ability
-            if not self.db.has_reroll_ability(ctx.author.id):
+            if not await self.has_reroll_ability(ctx.author.id):
                 await ctx.send("You don't have the reroll ability!")
                 return
 
-            # Get exact execution time of last успех command
-            execution_time = self.db.get_command_execution_time(ctx.author.id, "успех")
-            if not execution_time:
-                await ctx.send("No active успех roll to reroll! Use !успех first.")
-                return
+            # Get exact execution time of last успех command, from memory when known;
+            # otherwise its reroll flag and roll come back with it in one query
+            active_check = self.active_checks.get(ctx.author.id)
+            if active_check:
+                execution_time, rerolled = active_check
+                prev_success = None
+            else:
+                state = await self.db.run(self.db.get_reroll_state, ctx.author.id)
+                if not state:
+                    await ctx.send("No active успех roll to reroll! Use !успех first.")
+                    return
+                execution_time = state['execution_time']
+                rerolled = state['rerolled']
+                prev_success = state['success_level']
 
             # Check if roll is still valid (within 12 hours)
-            current_time = datetime.now()
-            if current_time > execution_time + timedelta(hours=12):
+            current_time = datetime.now(timezone.utc).replace(tzinfo=None)  # Execution times are stored in UTC
+            if (current_time - execution_time).total_seconds() > SUCCESS_COOLDOWN_SECONDS:
                 await ctx.send("Your last success check has expired! Use !успех for a new roll.")
                 return
 
             # Check if already rerolled this command
-            if self.db.has_rerolled(ctx.author.id, execution_time):
+            if rerolled:
                 await ctx.send("You've already used your reroll for this успех check!")
                 return
 
             # Get the previous success level from database
-            prev_success = None
-            with self.db.get_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                    SELECT success_level
-                    FROM command_usage
-                    WHERE user_id = ? AND command_name = 'успех'
-                    AND used_at >= ?
-                    ORDER BY used_at DESC
-                    LIMIT 1
-                ''', (ctx.author.id, last_used))
-                result = cursor.fetchone()
-                if result:
-                    prev_success = result['success_level']
+            if active_check:
+                prev_success = await self.db.run(self.db.get_last_success_level, ctx.author.id, execution_time)
 
             if prev_success is not None:
                 # Subtract the previous success level from total_success
-                with self.db.get_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute('''
-                        UPDATE users
-                        SET total_success = total_success - ?
-                        WHERE user_id = ?
-                    ''', (prev_success, ctx.author.id))
-                    conn.commit()
+                await self.db.run(self.db.remove_total_success, ctx.author.id, prev_success)
 
             # Process reroll
             message, success_level = await self.handle_success_roll(ctx)
             
             # Mark this command as rerolled with exact execution time
-            self.db.add_reroll_usage(ctx.author.id, execution_time)
+            await self.db.run(self.db.add_reroll_usage, ctx.author.id, execution_time)
+            self.active_checks[ctx.author.id] = (execution_time, True)
             
             await ctx.send(message)
 
         except Exception as e:
+            logging.exception("Error in reroll command")
             await ctx.send("Error processing reroll. Please try again later.")
-            print(f"Error in reroll command: {str(e)}")
 
     @commands.hybrid_command(
     name="топ",
@@ -189,82 +368,15 @@ class Fun(commands.Cog):
 )
     async def success_leaderboard(self, ctx):
         """View the успех command leaderboard"""
-        leaderboard_data = self.db.get_success_leaderboard()
+        await ctx.defer()
+        
+        leaderboard_data = await self.get_success_leaderboard()
         
         if not leaderboard_data:
             await ctx.send("No успех data available yet!")
             return
 
-        embed = create_embed(
-            title="🏆 Business Empire Leaderboard 🏆",
-            description="The most successful businessmen:",
-            color=discord.Color.gold().value
-        )
-
-        # Safely get the maximum success score
-        max_success = 0
-        for entry in leaderboard_data:
-            success = entry.get('total_success', 0)  # Use get() with default value
-            if success > max_success:
-                max_success = success
-
-        # Format leaderboard entries
-        for i, entry in enumerate(leaderboard_data, 1):
-            # Safely get all values with defaults
-            total_success = entry.get('total_success', 0)
-            success_streak = entry.get('success_streak', 0)
-            has_reroll = entry.get('has_reroll_ability', False)
-            highest_success = entry.get('highest_success', 0)
-            avg_success = entry.get('avg_success', 0)
-            total_attempts = entry.get('total_attempts', 0)
-            username = entry.get('username', 'Unknown User')
-
-            # Determine medal and rank formatting
-            medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "👔"
-            
-            # Calculate success bar (protect against division by zero)
-            progress = min(1.0, total_success / max_success) if max_success > 0 else 0
-            bar_length = 8
-            filled = int(bar_length * progress)
-            bar = "▰" * filled + "▱" * (bar_length - filled)
-
-            # Format achievements
-            achievements = []
-            if has_reroll:
-                achievements.append("🎲 Reroll Master")
-            if success_streak >= 7:
-                achievements.append(f"🔥 {success_streak}d Streak")
-            if highest_success == 6:
-                achievements.append("⭐ Perfect Roll")
-            
-            # Calculate success tier
-            if total_success >= 1000:
-                tier = "💎 Business Legend"
-            elif total_success >= 500:
-                tier = "👑 Business Mogul"
-            elif total_success >= 250:
-                tier = "💼 Business Expert"
-            elif total_success >= 100:
-                tier = "📈 Rising Star"
-            else:
-                tier = "👔 Beginner"
-
-            # Format the entry text
-            value = [
-                f"{bar} **{total_success}** pts",
-                f"Rank: {tier}",
-                f"Avg Success: {avg_success:.1f} ({total_attempts} attempts)"
-            ]
-            
-            if achievements:
-                value.append(f"Achievements: {' '.join(achievements)}")
-
-            embed.add_field(
-                name=f"{medal} #{i} {username}",
-                value="\n".join(value),
-                inline=False
-            )
-        
+        embed = self.build_leaderboard_embed(leaderboard_data)
         await ctx.send(embed=embed)
 
     @commands.hybrid_command(
@@ -273,25 +385,18 @@ class Fun(commands.Cog):
     )
     async def success_stats(self, ctx):
         """View detailed success statistics"""
-        stats = self.db.get_success_stats(ctx.author.id)
+        await ctx.defer()
+        
+        stats = await self.get_success_stats(ctx.author.id)
         
         embed = create_embed(
             title=f"Success Stats for {ctx.author.name}",
-            color=discord.Color.gold().value
+            color=_GOLD
         )
         
         # Calculate success rank based on total success
         total_success = stats['total_success']
-        if total_success >= 1000:
-            rank = "💎 Business Legend"
-        elif total_success >= 500:
-            rank = "👑 Business Mogul"
-        elif total_success >= 250:
-            rank = "💼 Business Expert"
-        elif total_success >= 100:
-            rank = "📈 Rising Star"
-        else:
-            rank = "👔 Beginner"
+        rank = business_tier(total_success)
 
         # Main stats
         embed.add_field(
@@ -339,26 +444,26 @@ class Fun(commands.Cog):
         await ctx.defer()  # Acknowledge command while we wait for Random.org
         
         # Update database
-        self.db.update_user(ctx.author.id, ctx.author.name)
+        await self.db.run(self.db.update_user, ctx.author.id, ctx.author.name)
         
         try:
             number = await self.rng.randint(1, max_num)
-            self.db.log_command_usage(ctx.author.id, "roll", roll_value=number)
+            self.log_command_usage(ctx.author.id, "roll", roll_value=number)
             await ctx.send(f"{ctx.author.mention} rolled {number} 🎲")
         except Exception as e:
             await ctx.send("Error accessing Random.org. Please try again later.")
         
     @commands.hybrid_command(name = "logitech", description = "see why logitech is the way to go")
     async def logitech(self, ctx):
-        await ctx.send("i was asking about why to get razer when they copied logitech. that was all i wanted to know, theres no basis on anything said expect for ""its better"", but sure if 7ms is worth it for shitty QA and having to rma it in 3 months then go ahead. atleast with logitech you can upgrade to the powerplay and have the mouse charge while you play so you never have to worry about it.  ")
+        await ctx.send(_LOGITECH_MSG)
 
     @commands.hybrid_command(name = "razer", description = "see why razer is trash")
     async def razer(self, ctx):
-        await ctx.send("razer lost my trust when all i hear are issues online and that they just use gamer marketing to get people buying. like their razer switches which are just different coloured kailh switches")
+        await ctx.send(_RAZER_MSG)
 
     @commands.hybrid_command(name = "увлажнение", description = "Если нужно увлажнится")
     async def увлажнение(self, ctx):
-        number = random.randint(1, 100)
+        number = await self.rng.randint(1, 100)
         mention = ctx.author.mention
         await ctx.send(f"{mention} увлажнился на {number}%")
 
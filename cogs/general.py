@@ -4,31 +4,141 @@ import random
 from discord.ext import commands
 import config
 
+# Commands listed per page of a category's help
+HELP_PAGE_SIZE = 10
+
+class HelpPaginator(discord.ui.View):
+    """Previous/Next buttons that flip one help message between pages"""
+    def __init__(self, pages, author_id: int):
+        super().__init__(timeout=180)
+        self.pages = pages
+        self.author_id = author_id
+        self.index = 0
+        self.message = None  # Set once the help message is sent, so timeouts can edit it
+        self._update_buttons()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        """Only the user who asked for help may flip its pages"""
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message("Use the help command to browse it yourself!", ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        """Disable the buttons once they stop responding"""
+        for item in self.children:
+            item.disabled = True
+        if self.message is not None:
+            try:
+                await self.message.edit(view=self)
+            except discord.HTTPException:
+                pass  # The message was deleted or can no longer be edited
+
+    def _update_buttons(self):
+        self.previous_page.disabled = self.index == 0
+        self.next_page.disabled = self.index == len(self.pages) - 1
+
+    async def _show(self, interaction: discord.Interaction, index: int):
+        self.index = index
+        self._update_buttons()
+        await interaction.response.edit_message(embed=self.pages[index], view=self)
+
+    @discord.ui.button(emoji="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.index - 1)
+
+    @discord.ui.button(emoji="▶️", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.index + 1)
+
 class General(commands.Cog):
+    # Help category for each cog class; commands of unlisted cogs go under "Misc"
+    _CATEGORY_MAP = {
+        "Fun": "Fun & Games",
+        "Moderation": "Moderation",
+        "Admin": "Admin",
+        "Voice": "Voice & Music",
+        "Replies": "Auto-Replies",
+        "LLM": "Chat",
+    }
+
     def __init__(self, bot):
         self.bot = bot
-
+        # Grouped help categories and their rendered embeds, rebuilt only when
+        # cogs are (re)loaded or commands change
+        self._category_key = None
+        self._category_list = []
+        self._overview_embed = None
+        self._category_pages = []
 
     def get_command_category(self, command):
         """Determine the category of a command based on its cog or name"""
         if not command.cog:
             return "General"
+        return self._CATEGORY_MAP.get(command.cog.__class__.__name__, "Misc")
+
+    def get_category_list(self):
+        """Get (category, commands sorted by name) pairs, sorted by category"""
+        key = (tuple(self.bot.cogs.values()), len(self.bot.all_commands))
+        if key != self._category_key:
+            categories = {}
+            for command in self.bot.commands:
+                categories.setdefault(self.get_command_category(command), []).append(command)
+            self._category_list = [
+                (category, sorted(commands, key=lambda x: x.name))
+                for category, commands in sorted(categories.items())
+            ]
+            self._overview_embed = self.build_overview_embed(self._category_list)
+            self._category_pages = [
+                self.build_category_pages(category, commands)
+                for category, commands in self._category_list
+            ]
+            self._category_key = key
+        return self._category_list
+
+    def build_overview_embed(self, category_list):
+        """Build the help embed listing every category with its number"""
+        embed = discord.Embed(
+            title="Bot Help",
+            description="Choose a category number to view specific commands:",
+            color=discord.Color.blue()
+        )
+        
+        for idx, (category, commands) in enumerate(category_list, 1):
+            embed.add_field(
+                name=f"{idx}. {category} ({len(commands)})",
+                value=f"Use `{config.PREFIX}help {idx}` to view commands",
+                inline=True
+            )
             
-        cog_name = command.cog.__class__.__name__
-        if cog_name == "Fun":
-            return "Fun & Games"
-        elif cog_name == "Moderation":
-            return "Moderation"
-        elif cog_name == "Admin":
-            return "Admin"
-        elif cog_name == "Voice":
-            return "Voice & Music"
-        elif cog_name == "Replies":
-            return "Auto-Replies"
-        elif cog_name == "LLM":
-            return "Chat"
-        else:
-            return "Misc"
+        footer_text = f"Example: {config.PREFIX}help 1"
+        embed.set_footer(text=footer_text)
+        return embed
+        
+    def build_category_pages(self, category, commands):
+        """Build the help embeds for a category, HELP_PAGE_SIZE commands per page"""
+        page_count = max(1, -(-len(commands) // HELP_PAGE_SIZE))
+        pages = []
+        for page in range(page_count):
+            embed = discord.Embed(
+                title=f"{category} Commands",
+                description=f"List of {category.lower()} commands:",
+                color=discord.Color.blue()
+            )
+            
+            for command in commands[page * HELP_PAGE_SIZE:(page + 1) * HELP_PAGE_SIZE]:
+                embed.add_field(
+                    name=f"{config.PREFIX}{command.name}",
+                    value=command.description or "No description available",
+                    inline=False
+                )
+            
+            footer_text = f"Type {config.PREFIX}help to see all categories"
+            if page_count > 1:
+                footer_text = f"Page {page + 1}/{page_count} • {footer_text}"
+            embed.set_footer(text=footer_text)
+            pages.append(embed)
+        return pages
         
     @commands.Cog.listener()
     async def on_message(self, message):
@@ -44,56 +154,20 @@ class General(commands.Cog):
     async def help(self, ctx, category_num: int = None):
         """Shows help information, optionally filtered by category number"""
         
-        # Get all commands and their categories
-        categories = {}
-        for command in self.bot.commands:
-            cmd_category = self.get_command_category(command)
-            if cmd_category not in categories:
-                categories[cmd_category] = []
-            categories[cmd_category].append(command)
-
-        # Convert to sorted list for consistent numbering
-        category_list = sorted(categories.items())
+        category_list = self.get_category_list()
 
         if category_num is not None and 1 <= category_num <= len(category_list):
-            # Show specific category
-            category, commands = category_list[category_num - 1]
-            embed = discord.Embed(
-                title=f"{category} Commands",
-                description=f"List of {category.lower()} commands:",
-                color=discord.Color.blue()
-            )
-            
-            for command in sorted(commands, key=lambda x: x.name):
-                embed.add_field(
-                    name=f"{config.PREFIX}{command.name}",
-                    value=command.description or "No description available",
-                    inline=False
-                )
-            
-            footer_text = f"Type {config.PREFIX}help to see all categories"
-            embed.set_footer(text=footer_text)
-            await ctx.send(embed=embed)
+            # Show specific category, one page at a time when it is long
+            pages = self._category_pages[category_num - 1]
+            if len(pages) > 1:
+                view = HelpPaginator(pages, ctx.author.id)
+                view.message = await ctx.send(embed=pages[0], view=view)
+            else:
+                await ctx.send(embed=pages[0])
             
         else:
             # Show category overview
-            embed = discord.Embed(
-                title="Bot Help",
-                description="Choose a category number to view specific commands:",
-                color=discord.Color.blue()
-            )
-            
-            for idx, (category, commands) in enumerate(category_list, 1):
-                embed.add_field(
-                    name=f"{idx}. {category} ({len(commands)})",
-                    value=f"Use `{config.PREFIX}help {idx}` to view commands",
-                    inline=True
-                )
-                
-            footer_text = f"Example: {config.PREFIX}help 1"
-            embed.set_footer(text=footer_text)
-            
-            await ctx.send(embed=embed)
+            await ctx.send(embed=self._overview_embed)
 
 async def setup(bot):
     await bot.add_cog(General(bot))
\ No newline at end of file
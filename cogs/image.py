@@ -4,10 +4,40 @@ from discord.ext import commands
 import cv2
 import numpy as np
 import mediapipe as mp
-import tempfile
-import os
+import io
+import asyncio
+import threading
+from typing import Optional, Tuple
+from functools import lru_cache
 from utils.helpers import create_embed
 
+# Embed colors, resolved once instead of on every reply
+_RED = discord.Color.red().value
+
+# MediaPipe face mesh landmarks around each eye
+LEFT_EYE_INDICES = (33, 133, 160, 159, 158, 157, 173)
+RIGHT_EYE_INDICES = (362, 263, 387, 386, 385, 384, 398)
+EYE_INDICES = LEFT_EYE_INDICES + RIGHT_EYE_INDICES
+
+# Longest image edge, in pixels, passed to face detection
+MAX_DETECTION_EDGE = 1024
+
+# The red glow fades out over this many pixels outside an eye's radius
+GLOW_REACH = 10
+
+@lru_cache(maxsize=64)
+def _glow_patch(radius: int):
+    """Red intensity and coverage of the glow around an eye of this radius.
+
+    Matches drawing filled circles from radius + GLOW_REACH inwards, each
+    brighter than the last, with a full-intensity core inside radius - 3.
+    """
+    reach = radius + GLOW_REACH
+    yy, xx = np.ogrid[-reach:reach + 1, -reach:reach + 1]
+    steps = np.ceil(np.sqrt(xx * xx + yy * yy)) - radius + 3
+    intensity = (255 * (1 - np.clip(steps, 0, 13) / 13)).astype(np.uint8)
+    return intensity, steps <= 13
+
 class ImageProcessing(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
@@ -19,38 +49,22 @@ class ImageProcessing(commands.Cog):
             refine_landmarks=True,
             min_detection_confidence=0.5
         )
+        self._face_mesh_lock = threading.Lock()
 
     def get_eye_coordinates(self, image, face_landmarks):
         """Extract eye coordinates from MediaPipe face landmarks"""
         image_height, image_width = image.shape[:2]
         
-        # MediaPipe indices for eyes
-        LEFT_EYE_INDICES = [33, 133, 160, 159, 158, 157, 173]  # Left eye landmarks
-        RIGHT_EYE_INDICES = [362, 263, 387, 386, 385, 384, 398]  # Right eye landmarks
+        # Pixel coordinates of both eyes' landmarks at once, shaped (eye, point, xy)
+        landmarks = face_landmarks.landmark
+        points = np.array([(landmarks[idx].x, landmarks[idx].y) for idx in EYE_INDICES])
+        points = (points * (image_width, image_height)).astype(int).reshape(2, -1, 2)
         
-        # Get coordinates for both eyes
-        eyes = []
-        for eye_indices in [LEFT_EYE_INDICES, RIGHT_EYE_INDICES]:
-            points = []
-            for idx in eye_indices:
-                landmark = face_landmarks.landmark[idx]
-                x = int(landmark.x * image_width)
-                y = int(landmark.y * image_height)
-                points.append((x, y))
-            
-            # Calculate eye center and size
-            points = np.array(points)
-            center = np.mean(points, axis=0).astype(int)
-            
-            # Calculate eye width for radius
-            left_point = points[0]
-            right_point = points[3]
-            eye_width = np.linalg.norm(np.array(left_point) - np.array(right_point))
-            radius = int(eye_width / 2)
-            
-            eyes.append((center, radius))
+        # Eye centers, and radii as half the distance between the first and fourth points
+        centers = points.mean(axis=1).astype(int)
+        radii = (np.linalg.norm(points[:, 0] - points[:, 3], axis=1) / 2).astype(int)
         
-        return eyes
+        return [(center, int(radius)) for center, radius in zip(centers, radii)]
 
     def apply_demonic_effects(self, img, eyes):
         """Apply demonic effects to the eyes"""
@@ -58,15 +72,21 @@ class ImageProcessing(commands.Cog):
         glow_layer = np.zeros_like(img)
         streak_layer = np.zeros_like(img)
         
-        # Draw glowing red eyes and white streaks
+        # Paint a precomputed red glow around each eye, clipped to the image
+        image_height, image_width = img.shape[:2]
         for center, radius in eyes:
-            # Create smaller, more focused red glow
-            for r in range(radius + 10, radius - 3, -1):
-                intensity = int(255 * (1 - (r - radius + 3) / 13))
-                cv2.circle(glow_layer, tuple(center), r, (0, 0, intensity), -1)
+            intensity, mask = _glow_patch(radius)
+            reach = radius + GLOW_REACH
+            x, y = int(center[0]) - reach, int(center[1]) - reach
+            x0, y0 = max(x, 0), max(y, 0)
+            x1 = min(x + intensity.shape[1], image_width)
+            y1 = min(y + intensity.shape[0], image_height)
+            if x0 >= x1 or y0 >= y1:
+                continue
             
-            # Add bright center
-            cv2.circle(glow_layer, tuple(center), radius - 3, (0, 0, 255), -1)
+            patch = (slice(y0 - y, y1 - y), slice(x0 - x, x1 - x))
+            covered = mask[patch]
+            glow_layer[y0:y1, x0:x1, 2][covered] = intensity[patch][covered]
         
         # Apply different Gaussian blurs for glow and streaks
         glow_layer = cv2.GaussianBlur(glow_layer, (15, 15), 7)
@@ -76,6 +96,54 @@ class ImageProcessing(commands.Cog):
         
         return img
 
+    def demonify_image(self, image_data: bytes) -> Tuple[Optional[bytes], Optional[str]]:
+        """Apply demonic eyes to an encoded image.
+
+        Blocking; run it in a worker thread. Returns the processed PNG bytes,
+        or None and a message for the user when nothing can be drawn.
+        """
+        image_array = np.frombuffer(image_data, np.uint8)
+        img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
+        
+        if img is None:
+            return None, "Failed to process the image!"
+
+        # Detect on a copy no larger than MAX_DETECTION_EDGE; landmarks are
+        # normalized, so they still map straight onto the full-size image
+        scale = MAX_DETECTION_EDGE / max(img.shape[:2])
+        if scale < 1:
+            detect_img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        else:
+            detect_img = img
+
+        # Convert BGR to RGB for MediaPipe
+        rgb_image = cv2.cvtColor(detect_img, cv2.COLOR_BGR2RGB)
+        
+        # Detect face landmarks; the FaceMesh graph can only run one image at a time
+        with self._face_mesh_lock:
+            results = self.face_mesh.process(rgb_image)
+        
+        if not results.multi_face_landmarks:
+            return None, "No faces detected in the image!"
+
+        # Get eye coordinates for all faces
+        all_eyes = []
+        for face_landmarks in results.multi_face_landmarks:
+            eyes = self.get_eye_coordinates(img, face_landmarks)
+            all_eyes.extend(eyes)
+
+        if not all_eyes:
+            return None, "No eyes detected in the image!"
+
+        # Apply demonic effects
+        processed_img = self.apply_demonic_effects(img, all_eyes)
+
+        # Encode the processed image in memory
+        encoded, png = cv2.imencode('.png', processed_img)
+        if not encoded:
+            return None, "Failed to process the image!"
+        return png.tobytes(), None
+
     @commands.hybrid_command(
         name="deamonify",
         description="Detect eyes and make them glow demonically"
@@ -98,68 +166,38 @@ class ImageProcessing(commands.Cog):
         await ctx.defer()  # Defer response since image processing might take time
 
         try:
-            # Download the image
+            # Download the image, then decode, detect and draw in a worker thread
             image_data = await attachment.read()
-            image_array = np.frombuffer(image_data, np.uint8)
-            img = cv2.imdecode(image_array, cv2.IMREAD_COLOR)
-            
-            if img is None:
-                await ctx.send("Failed to process the image!")
-                return
-
-            # Convert BGR to RGB for MediaPipe
-            rgb_image = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Detect face landmarks
-            results = self.face_mesh.process(rgb_image)
+            png, error = await asyncio.to_thread(self.demonify_image, image_data)
             
-            if not results.multi_face_landmarks:
-                await ctx.send("No faces detected in the image!")
-                return
-
-            # Get eye coordinates for all faces
-            all_eyes = []
-            for face_landmarks in results.multi_face_landmarks:
-                eyes = self.get_eye_coordinates(img, face_landmarks)
-                all_eyes.extend(eyes)
-
-            if not all_eyes:
-                await ctx.send("No eyes detected in the image!")
+            if error:
+                await ctx.send(error)
                 return
 
-            # Apply demonic effects
-            processed_img = self.apply_demonic_effects(img, all_eyes)
-
-            # Save the processed image
-            with tempfile.NamedTemporaryFile(suffix='.png', delete=False) as tmp_file:
-                cv2.imwrite(tmp_file.name, processed_img)
-                
-                # Create embed
-                embed = create_embed(
-                    title="👿 Demonic Eye Transformation",
-                    color=discord.Color.red().value
-                )
-
-                # Send the processed image
-                await ctx.send(
-                    embed=embed,
-                    file=discord.File(tmp_file.name, 'processed_image.png')
-                )
+            # Create embed
+            embed = create_embed(
+                title="👿 Demonic Eye Transformation",
+                color=_RED
+            )
 
-            # Clean up temporary file
-            os.unlink(tmp_file.name)
+            # Send the processed image
+            await ctx.send(
+                embed=embed,
+                file=discord.File(io.BytesIO(png), 'processed_image.png')
+            )
 
         except Exception as e:
             error_embed = create_embed(
                 title="Error",
                 description=f"Failed to process image: {str(e)}",
-                color=discord.Color.red().value
+                color=_RED
             )
             await ctx.send(embed=error_embed)
 
     def cog_unload(self):
         """Cleanup when cog is unloaded"""
-        self.face_mesh.close()
+        with self._face_mesh_lock:  # Wait for a detection still running in a worker thread
+            self.face_mesh.close()
 
 async def setup(bot):
     await bot.add_cog(ImageProcessing(bot))
\ No newline at end of file
@@ -2,19 +2,65 @@
 import discord
 from discord.ext import commands
 from utils.helpers import create_embed
-from utils.ollama_handler import OllamaHandler, ModelConfig
+from utils.ollama_handler import get_ollama_handler, ModelConfig, OllamaError
 import os
-from typing import Optional, List  # Added List import
+from typing import Optional, List, Dict, AsyncIterator
 import logging
 import asyncio
+import re
+from contextlib import nullcontext
+import time
+
+OLLAMA_URL = os.environ.get('OLLAMA_URL', 'http://ollama:11434')
+
+# Embed colors, resolved once instead of on every reply
+_RED = discord.Color.red().value
+_BLUE = discord.Color.blue().value
+_GREEN = discord.Color.green().value
+
+# Streamed replies are posted in messages of at most this many characters
+STREAM_CHUNK_SIZE = 1900
+# Seconds between edits that show a streamed chunk while it is still being written
+STREAM_EDIT_INTERVAL = 1.5
+
+# Tags around the thinking section some models start their reply with
+_THINK_OPEN = "<think>"
+_THINK_CLOSE = "</think>"
+_THINK_RE = re.compile(r'<think>(.*?)</think>', re.IGNORECASE | re.DOTALL)
+
+# Discord rejects embeds with more fields than this
+MAX_EMBED_FIELDS = 25
+
+# Generations one user may have in flight; further requests are turned away.
+# Across all users, the Ollama handler's adaptive limiter queues requests
+MAX_USER_REQUESTS = 2
+
+def _error_embed(description: str) -> discord.Embed:
+    """Build the red "Error" embed every failure path replies with"""
+    return create_embed(title="Error", description=description, color=_RED)
+
+def _clip(text: str, limit: int) -> str:
+    """Truncate text to limit characters, marking the cut with an ellipsis"""
+    return text if len(text) <= limit else f"{text[:limit]}..."
+
+def _chunk(text: str, size: int = 2000):
+    """Yield pieces of at most size characters, preferring to cut at a newline"""
+    start = 0
+    length = len(text)
+    while length - start > size:
+        end = text.rfind('\n', start + 1, start + size + 1)
+        if end == -1:
+            end = start + size
+        yield text[start:end]
+        start = end
+    yield text[start:]
 
 class LLM(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         
-        # Initialize Ollama handler
-        ollama_url = os.getenv('OLLAMA_URL', 'http://ollama:11434')
-        self.ollama = OllamaHandler(base_url=ollama_url)
+        # Shared Ollama handler, so its HTTP session and histories survive cog reloads
+        self.ollama = get_ollama_handler(OLLAMA_URL)
         
         # Register models with specific configurations
         self.model_configs = {
@@ -42,18 +88,54 @@ class LLM(commands.Cog):
         for config in self.model_configs.values():
             self.ollama.register_model(config)
 
+        # In-flight generations per user id; users without any are removed
+        self._user_requests: Dict[int, int] = {}
+
+        # Pattern and prefixes matching both mention forms of the bot user, built once the bot is ready
+        self._mention_re: Optional[re.Pattern] = None
+        self._mention_prefixes: tuple = ()
+        if self.bot.user:
+            self._compile_mention_re()
+
+    def _compile_mention_re(self):
+        """Compile the plain and nickname mention pattern for the bot user"""
+        self._mention_re = re.compile(rf'<@!?{self.bot.user.id}>')
+        self._mention_prefixes = (f'<@{self.bot.user.id}>', f'<@!{self.bot.user.id}>')
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Compile the mention pattern once the bot user is known"""
+        self._compile_mention_re()
+
+    def _acquire_user_slot(self, user_id: int) -> bool:
+        """Reserve a generation slot for a user, unless they already use all of theirs"""
+        count = self._user_requests.get(user_id, 0)
+        if count >= MAX_USER_REQUESTS:
+            return False
+        self._user_requests[user_id] = count + 1
+        return True
+
+    def _release_user_slot(self, user_id: int):
+        """Give back a slot reserved with _acquire_user_slot"""
+        count = self._user_requests.pop(user_id, 0) - 1
+        if count > 0:
+            self._user_requests[user_id] = count
+
+    def _busy_embed(self) -> discord.Embed:
+        """Embed telling a user to wait for their earlier requests"""
+        return create_embed(
+            title="Busy",
+            description="You already have requests in progress, try again once they finish.",
+            color=_RED
+        )
+
     def format_model_response(self, content: str) -> tuple[str, Optional[str]]:
         """Format model response by separating thinking and response parts"""
-        try:
-            if "<think>" in content.lower() and "</think>" in content.lower():
-                parts = content.split("</think>", 1)
-                thinking = parts[0].replace("<think>", "").strip()
-                response = parts[1].strip() if len(parts) > 1 else ""
-                return response, thinking
-            return content, None
-        except Exception as e:
-            logging.error(f"Error formatting model response: {e}")
+        match = _THINK_RE.search(content)
+        if match is None:
             return content, None
+        response = content[:match.start()] + content[match.end():]
+        return response.strip(), match.group(1).strip()
 
     async def send_chunked_message(self, ctx, content: str, reply_to=None) -> Optional[discord.Message]:
         """Send a message in chunks if it's too long"""
@@ -64,61 +146,94 @@ class LLM(commands.Cog):
                 else:
                     return await ctx.send(content)
 
-            chunks = [content[i:i+2000] for i in range(0, len(content), 2000)]
-            last_message = None
-            for i, chunk in enumerate(chunks):
-                if i == 0 and reply_to:
-                    last_message = await reply_to.reply(chunk)
-                else:
-                    if reply_to:
-                        last_message = await reply_to.channel.send(chunk)
-                    else:
-                        last_message = await ctx.send(chunk)
+            # Slightly oversized replies are the common case, split them directly in two
+            if len(content) <= 4000:
+                first, rest = content[:2000], iter((content[2000:],))
+            else:
+                # Later chunks are only sliced off as they are sent
+                rest = _chunk(content)
+                first = next(rest)
+
+            if reply_to:
+                last_message = await reply_to.reply(first)
+                send = reply_to.channel.send
+            else:
+                last_message = await ctx.send(first)
+                send = ctx.send
+
+            # One at a time, since concurrent sends can land out of order
+            for chunk in rest:
+                last_message = await send(chunk)
             return last_message
         except Exception as e:
             logging.error(f"Error in send_chunked_message: {e}")
             raise
 
-    async def chunk_text(self, text: str, chunk_size: int = 1900) -> List[str]:
-        """Split text into chunks while preserving word boundaries"""
+    def chunk_text(self, text: str, chunk_size: int = 1900) -> List[str]:
+        """Split text into chunks, breaking at the last space or newline that fits"""
         chunks = []
-        current_chunk = ""
+        pos = 0
+        length = len(text)
         
-        for word in text.split():
-            if len(current_chunk) + len(word) + 1 > chunk_size:
-                chunks.append(current_chunk.strip())
-                current_chunk = word
+        while pos < length:
+            end = pos + chunk_size
+            if end >= length:
+                end = next_pos = length
             else:
-                current_chunk += " " + word if current_chunk else word
-                
-        if current_chunk:
-            chunks.append(current_chunk.strip())
+                # Break on whitespace when there is some, dropping the separator
+                split = max(text.rfind(" ", pos, end + 1), text.rfind("\n", pos, end + 1))
+                if split > pos:
+                    end, next_pos = split, split + 1
+                else:
+                    next_pos = end
+            chunk = text[pos:end].strip()
+            if chunk:
+                chunks.append(chunk)
+            pos = next_pos
             
         return chunks
 
     async def send_message_chunks(self, chunks: List[str], ctx=None, reply_to=None) -> Optional[discord.Message]:
-        """Send a list of chunks as sequential messages"""
-        first_message = None
+        """Send a list of chunks as a reply followed by continuation messages"""
+        if not chunks:
+            return None
+            
+        last = len(chunks) - 1
+        contents = [
+            f"{'... ' if i else ''}{chunk}{' ...' if i < last else ''}"
+            for i, chunk in enumerate(chunks)
+        ]
+
+        if reply_to:
+            first_message = await reply_to.reply(contents[0])
+            send = reply_to.channel.send
+        else:
+            first_message = await ctx.send(contents[0])
+            send = ctx.send
+
+        # One at a time, since concurrent sends can land out of order
+        for content in contents[1:]:
+            await send(content)
+                    
+        return first_message
+
+    async def send_thinking(self, ctx, thinking: str, reply_to=None):
+        """Send a model's thinking section as code-block messages"""
+        thinking_chunks = self.chunk_text(thinking, 1800)  # Smaller size for formatting
+        last = len(thinking_chunks) - 1
         
-        for i, chunk in enumerate(chunks):
-            content = chunk
-            if i < len(chunks) - 1:
-                content += " ..."
-            if i > 0:
-                content = "... " + content
-
-            if i == 0:
-                if reply_to:
-                    first_message = await reply_to.reply(content)
+        for i, chunk in enumerate(thinking_chunks):
+            before = "... " if i else ""
+            after = " ..." if i < last else ""
+            thinking_msg = f"💭 **Thinking Process:**\n```\n{before}{chunk}{after}\n```"
+            
+            if reply_to:
+                if i == 0:
+                    await reply_to.reply(thinking_msg)
                 else:
-                    first_message = await ctx.send(content)
+                    await reply_to.channel.send(thinking_msg)
             else:
-                if reply_to:
-                    await reply_to.channel.send(content)
-                else:
-                    await ctx.send(content)
-                    
-        return first_message
+                await ctx.send(thinking_msg)
 
     async def send_response_with_thinking(self, ctx, response: str, thinking: Optional[str] = None, reply_to=None) -> Optional[discord.Message]:
         """Send response with optional thinking section"""
@@ -127,74 +242,138 @@ class LLM(commands.Cog):
             if not thinking:
                 return await self.send_chunked_message(ctx, response, reply_to)
 
-            # First send the thinking part
-            thinking_chunks = await self.chunk_text(thinking, 1800)  # Smaller size for formatting
-            
-            # Send thinking chunks
-            for i, chunk in enumerate(thinking_chunks):
-                content = chunk
-                if i < len(thinking_chunks) - 1:
-                    content += " ..."
-                if i > 0:
-                    content = "... " + content
-
-                thinking_msg = f"💭 **Thinking Process:**\n```\n{content}\n```"
-                
-                if reply_to:
-                    if i == 0:
-                        await reply_to.reply(thinking_msg)
-                    else:
-                        await reply_to.channel.send(thinking_msg)
-                else:
-                    await ctx.send(thinking_msg)
-
-            # Then send the actual response
-            response_chunks = await self.chunk_text(response)
+            # First send the thinking part, then the actual response
+            await self.send_thinking(ctx, thinking, reply_to)
+            response_chunks = self.chunk_text(response)
             return await self.send_message_chunks(response_chunks, ctx, reply_to)
 
         except Exception as e:
             logging.error(f"Error in send_response_with_thinking: {e}")
             raise
 
+    async def send_streamed_response(self, ctx, pieces: AsyncIterator[str], text: str = "") -> Optional[discord.Message]:
+        """Send a streamed model response, showing each chunk while it is written.
+
+        A leading <think> section is held back until it closes and then sent
+        like send_response_with_thinking does; the rest goes out in chunks of
+        at most STREAM_CHUNK_SIZE characters, cut at a newline when possible.
+        The chunk in progress is posted early and edited every
+        STREAM_EDIT_INTERVAL seconds until it is complete.
+        """
+        last_message = None
+        draft: Optional[discord.Message] = None
+        shown = ""
+        last_edit = time.monotonic()
+        
+        async def flush(final: bool):
+            nonlocal text, last_message, draft, shown, last_edit
+            while len(text) > STREAM_CHUNK_SIZE or (final and text.strip()):
+                cut = len(text)
+                if cut > STREAM_CHUNK_SIZE:
+                    cut = text.rfind('\n', 1, STREAM_CHUNK_SIZE + 1)
+                    if cut == -1:
+                        cut = STREAM_CHUNK_SIZE
+                chunk, text = text[:cut], text[cut:]
+                if draft is not None:
+                    # The draft shows a prefix of this chunk, so finish it in place
+                    if chunk != shown:
+                        await draft.edit(content=chunk)
+                    last_message, draft, shown = draft, None, ""
+                elif chunk.strip():
+                    last_message = await ctx.send(chunk)
+            
+            now = time.monotonic()
+            if not final and text != shown and text.strip() and now - last_edit >= STREAM_EDIT_INTERVAL:
+                if draft is None:
+                    draft = await ctx.send(text)
+                else:
+                    await draft.edit(content=text)
+                shown, last_edit = text, now
+        
+        async def split_thinking(final: bool) -> bool:
+            """Send a leading thinking section once it is complete; False while it is undecided"""
+            nonlocal text
+            opening = text.lstrip()[:len(_THINK_OPEN)].lower()
+            if not final and _THINK_OPEN.startswith(opening) and len(opening) < len(_THINK_OPEN):
+                return False  # Too little text yet to tell whether a thinking section starts
+            if opening == _THINK_OPEN:
+                if _THINK_CLOSE not in text.lower():
+                    return final  # An unclosed section at the end is sent as plain text
+                text, thinking = self.format_model_response(text)
+                if thinking:
+                    await self.send_thinking(ctx, thinking)
+            return True
+        
+        # The first piece is passed in as text, and may already hold the whole reply
+        thinking_checked = await split_thinking(final=False)
+        async for piece in pieces:
+            text += piece
+            if not thinking_checked:
+                thinking_checked = await split_thinking(final=False)
+                if not thinking_checked:
+                    continue
+            await flush(final=False)
+        
+        if not thinking_checked:
+            await split_thinking(final=True)
+        await flush(final=True)
+        return last_message
+
     @commands.Cog.listener()
     async def on_message(self, message):
         """Handle mentions using the rude bot model"""
-        if message.author == self.bot.user:
+        # Ignore other bots (and ourselves) to avoid reply loops
+        if message.author.bot:
             return
             
-        if self.bot.user in message.mentions:
-            content = message.content.replace(f'<@{self.bot.user.id}>', '').strip()
-            if content:
-                response_message = None
-                try:
-                    async with message.channel.typing():
-                        response = await self.ollama.generate_response(
-                            message.author.id,
-                            content,
-                            self.model_configs['mention'].model_name
-                        )
-                    
-                    if response.startswith("Error:"):
-                        embed = create_embed(
-                            title="Error",
-                            description=response,
-                            color=discord.Color.red().value
-                        )
-                        response_message = await message.reply(embed=embed)
-                    else:
-                        # Split into response and thinking parts
-                        response_text, thinking = self.format_model_response(response)
-                        response_message = await self.send_response_with_thinking(None, response_text, thinking, reply_to=message)
-                
-                except Exception as e:
-                    logging.error(f"Error in on_message handler: {e}")
-                    embed = create_embed(
-                        title="Error",
-                        description=f"An error occurred: {str(e)}",
-                        color=discord.Color.red().value
-                    )
-                    if not response_message:
-                        await message.reply(embed=embed)
+        # mentions also covers replies that ping the bot, which have no <@id> in the content
+        if self.bot.user not in message.mentions:
+            return
+            
+        if self._mention_re is None:
+            self._compile_mention_re()
+        content = message.content
+        if content.startswith(self._mention_prefixes):
+            # The usual "@bot question": slice the mention off instead of scanning the text
+            content = content[content.index('>') + 1:]
+        if '<@' in content:
+            content = self._mention_re.sub('', content)
+        content = content.strip()
+        if not content:
+            return
+            
+        if not self._acquire_user_slot(message.author.id):
+            await message.reply(embed=self._busy_embed())
+            return
+            
+        response_message = None
+        try:
+            model_name = self.model_configs['mention'].model_name
+            # Cached replies are sent straight away, so there is nothing to show typing for
+            cached = self.ollama.has_cached_response(message.author.id, content, model_name)
+            async with nullcontext() if cached else message.channel.typing():
+                # Shielded so a cancelled listener still lets the reply finish and get cached
+                result = await asyncio.shield(self.ollama.generate_response(
+                    message.author.id,
+                    content,
+                    model_name
+                ))
+            
+            if not result.ok:
+                embed = _error_embed(f"Error: {result.error}")
+                response_message = await message.reply(embed=embed)
+            else:
+                # Split into response and thinking parts
+                response_text, thinking = self.format_model_response(result.text)
+                response_message = await self.send_response_with_thinking(None, response_text, thinking, reply_to=message)
+        
+        except Exception as e:
+            logging.error(f"Error in on_message handler: {e}")
+            embed = _error_embed(f"An error occurred: {str(e)}")
+            if not response_message:
+                await message.reply(embed=embed)
+        finally:
+            self._release_user_slot(message.author.id)
 
     @commands.hybrid_command(
         name="chat",
@@ -202,45 +381,41 @@ class LLM(commands.Cog):
     )
     async def chat(self, ctx, *, message: str):
         """Chat with the technical assistant model"""
-        await ctx.defer()
+        if not self._acquire_user_slot(ctx.author.id):
+            await ctx.send(embed=self._busy_embed())
+            return
+            
         response_message = None
-        
         try:
-            async with ctx.typing():
-                response = await self.ollama.generate_response(
+            model_name = self.model_configs['chat'].model_name
+            # Always deferred: the cache entry could be evicted before the reply is
+            # looked up, and a real generation must not hit the 3s interaction limit.
+            # Only the typing indicator is skipped for a reply expected from the cache
+            await ctx.defer()
+            cached = self.ollama.has_cached_response(ctx.author.id, message, model_name)
+            # The user's slot is held until the whole reply has streamed out
+            async with nullcontext() if cached else ctx.typing():
+                # Replies go out chunk by chunk while the model is still generating
+                pieces = self.ollama.stream_response(
                     ctx.author.id,
                     message,
-                    self.model_configs['chat'].model_name
+                    model_name
                 )
-            
-            if not response or response.isspace():
-                embed = create_embed(
-                    title="Error",
-                    description="Received empty response from the model. Please try again.",
-                    color=discord.Color.red().value
-                )
-                response_message = await ctx.send(embed=embed)
-            elif response.startswith("Error:"):
-                embed = create_embed(
-                    title="Error",
-                    description=response,
-                    color=discord.Color.red().value
-                )
-                response_message = await ctx.send(embed=embed)
-            else:
-                # Split into response and thinking parts
-                response_text, thinking = self.format_model_response(response)
-                response_message = await self.send_response_with_thinking(ctx, response_text, thinking)
+                try:
+                    first = await anext(pieces, "")
+                except OllamaError as e:
+                    embed = _error_embed(f"Error: {e}")
+                    response_message = await ctx.send(embed=embed)
+                else:
+                    response_message = await self.send_streamed_response(ctx, pieces, first)
             
         except Exception as e:
             logging.error(f"Error in chat command: {e}")
-            embed = create_embed(
-                title="Error",
-                description=f"An error occurred: {str(e)}",
-                color=discord.Color.red().value
-            )
+            embed = _error_embed(f"An error occurred: {str(e)}")
             if not response_message:
                 await ctx.send(embed=embed)
+        finally:
+            self._release_user_slot(ctx.author.id)
 
     @commands.hybrid_command(
         name="clear_chat",
@@ -264,16 +439,12 @@ class LLM(commands.Cog):
             embed = create_embed(
                 title="Chat History Cleared",
                 description=description,
-                color=discord.Color.green().value
+                color=_GREEN
             )
             message = await ctx.send(embed=embed)
         except Exception as e:
             logging.error(f"Error in clear_chat: {e}")
-            embed = create_embed(
-                title="Error",
-                description=f"Failed to clear history: {str(e)}",
-                color=discord.Color.red().value
-            )
+            embed = _error_embed(f"Failed to clear history: {str(e)}")
             if not message:
                 await ctx.send(embed=embed)
 
@@ -300,7 +471,7 @@ class LLM(commands.Cog):
                 embed = create_embed(
                     title=title,
                     description="No chat history found.",
-                    color=discord.Color.blue().value
+                    color=_BLUE
                 )
                 message = await ctx.send(embed=embed)
                 return
@@ -308,15 +479,14 @@ class LLM(commands.Cog):
             embed = create_embed(
                 title=title,
                 description="Here's your recent chat history:",
-                color=discord.Color.blue().value
+                color=_BLUE
             )
 
-            for i, msg in enumerate(history, 1):
+            for i, msg in enumerate(history[:MAX_EMBED_FIELDS], 1):
                 role = "You" if msg["role"] == "user" else "Bot"
-                content = msg["content"][:1000] + "..." if len(msg["content"]) > 1000 else msg["content"]
                 embed.add_field(
                     name=f"{i}. {role}",
-                    value=content,
+                    value=_clip(msg["content"], 1000),
                     inline=False
                 )
 
@@ -324,11 +494,7 @@ class LLM(commands.Cog):
 
         except Exception as e:
             logging.error(f"Error in show_history: {e}")
-            embed = create_embed(
-                title="Error",
-                description=f"Failed to show history: {str(e)}",
-                color=discord.Color.red().value
-            )
+            embed = _error_embed(f"Failed to show history: {str(e)}")
             if not message:
                 await ctx.send(embed=embed)
 
@@ -344,7 +510,7 @@ class LLM(commands.Cog):
             
             embed = create_embed(
                 title=f"Model Statistics (Last {minutes} minutes)",
-                color=discord.Color.blue().value
+                color=_BLUE
             )
             
             embed.add_field(
@@ -383,12 +549,34 @@ class LLM(commands.Cog):
             
         except Exception as e:
             logging.error(f"Error in model_stats: {e}")
-            embed = create_embed(
-                title="Error",
-                description=f"Failed to get model statistics: {str(e)}",
-                color=discord.Color.red().value
-            )
+            embed = _error_embed(f"Failed to get model statistics: {str(e)}")
             await ctx.send(embed=embed)
 
+    @commands.hybrid_command(
+        name="cache_stats",
+        description="Show response cache statistics"
+    )
+    @commands.has_permissions(administrator=True)
+    async def cache_stats(self, ctx):
+        """Show response cache hits, misses and size"""
+        stats = self.ollama.response_cache.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+        
+        embed = create_embed(
+            title="Response Cache Statistics",
+            color=_BLUE
+        )
+        embed.add_field(name="Hits", value=str(stats["hits"]), inline=True)
+        embed.add_field(name="Misses", value=str(stats["misses"]), inline=True)
+        embed.add_field(name="Hit Rate", value=f"{hit_rate:.1f}%", inline=True)
+        embed.add_field(
+            name="Size",
+            value=f"{stats['size']}/{self.ollama.response_cache.maxsize}",
+            inline=True
+        )
+        
+        await ctx.send(embed=embed)
+
 async def setup(bot):
     await bot.add_cog(LLM(bot))
\ No newline at end of file
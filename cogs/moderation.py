@@ -2,33 +2,56 @@
 import discord
 from discord.ext import commands
 from utils.helpers import create_embed
-from utils.db_handler import DatabaseHandler
+from utils.db_handler import get_db
 from utils.word_filter import WordFilter
+from utils.batch_writer import BatchWriter
 from typing import Optional
 from datetime import datetime
+import logging
+
+# Embed colors, resolved once instead of on every reply
+_GREEN = discord.Color.green().value
+_YELLOW = discord.Color.yellow().value
+_BLUE = discord.Color.blue().value
+_GOLD = discord.Color.gold().value
+
+# Tracked word uses are written in batches of up to this many rows, at most this often (seconds)
+WORD_FLUSH_BATCH = 500
+WORD_FLUSH_INTERVAL = 0.5
 
 class Moderation(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.db = DatabaseHandler()
+        self.db = get_db()  # Shared with Fun; queries run off the event loop
         self.word_filter = WordFilter()
+        # (user_id, word) rows, written in the background in batches
+        self._word_writer = BatchWriter(self.db, self.db.log_word_usages, "word usage",
+                                        batch_size=WORD_FLUSH_BATCH, interval=WORD_FLUSH_INTERVAL)
+
+    async def cog_load(self):
+        """Start writing queued word uses in the background"""
+        self._word_writer.start()
+
+    async def cog_unload(self):
+        """Stop the flusher and write whatever is still queued"""
+        await self._word_writer.close()
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """Monitor messages for tracked words"""
-        if message.author.bot:
+        # Bots, and messages that are only attachments or embeds, never need a scan
+        if message.author.bot or not message.content:
             return
 
         # Check message for tracked words
         found_words = self.word_filter.check_message(message.content)
         
-        if found_words:
-            # Update database for each found word
-            for word in found_words:
-                self.db.log_word_usage(
-                    message.author.id,
-                    word
-                )
+        # Queued rather than awaited, so the listener never waits on SQLite
+        user_id = message.author.id
+        for word in found_words:
+            if not self._word_writer.put((user_id, word)):
+                logging.warning("Word usage queue full, dropping a use by %s", user_id)
+                break
 
     @commands.hybrid_command(name="addword", description="Add a word to track")
     @commands.has_permissions(manage_messages=True)
@@ -44,13 +67,13 @@ class Moderation(commands.Cog):
             embed = create_embed(
                 title="Word Added",
                 description="The specified word has been added to the tracking list.",
-                color=discord.Color.green().value
+                color=_GREEN
             )
         else:
             embed = create_embed(
                 title="Already Tracked",
                 description="This word is already being tracked.",
-                color=discord.Color.yellow().value
+                color=_YELLOW
             )
         
         # Send response as ephemeral message
@@ -70,13 +93,13 @@ class Moderation(commands.Cog):
             embed = create_embed(
                 title="Word Removed",
                 description="The specified word has been removed from tracking.",
-                color=discord.Color.green().value
+                color=_GREEN
             )
         else:
             embed = create_embed(
                 title="Not Found",
                 description="This word was not being tracked.",
-                color=discord.Color.yellow().value
+                color=_YELLOW
             )
         
         # Send response as ephemeral message
@@ -87,7 +110,7 @@ class Moderation(commands.Cog):
     async def word_stats(self, ctx, user: Optional[discord.Member] = None):
         """View word usage statistics for a user"""
         target_user = user or ctx.author
-        stats = self.db.get_user_word_stats(target_user.id)
+        stats = await self.db.run(self.db.get_user_word_stats, target_user.id)
         
         if not stats:
             await ctx.send(f"No tracked words found for {target_user.name}")
@@ -95,7 +118,7 @@ class Moderation(commands.Cog):
 
         embed = create_embed(
             title=f"Word Statistics for {target_user.name}",
-            color=discord.Color.blue().value
+            color=_BLUE
         )
 
         # Add stats for each word
@@ -114,7 +137,7 @@ class Moderation(commands.Cog):
     @commands.has_permissions(manage_messages=True)
     async def word_leaderboard(self, ctx, word: Optional[str] = None):
         """View leaderboard for word usage"""
-        leaderboard = self.db.get_word_leaderboard(word)
+        leaderboard = await self.db.run(self.db.get_word_leaderboard, word)
         
         if not leaderboard:
             await ctx.send("No word usage data found")
@@ -130,7 +153,7 @@ class Moderation(commands.Cog):
         embed = create_embed(
             title=title,
             description=description,
-            color=discord.Color.gold().value
+            color=_GOLD
         )
 
         for i, entry in enumerate(leaderboard, 1):
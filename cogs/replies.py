@@ -1,10 +1,24 @@
 # cogs/replies.py
 import discord
 from discord.ext import commands
-from typing import Dict, List, Union, Tuple
+from typing import Dict, List, Union, Tuple, Optional
 import json
 import os
-from utils.helpers import create_embed
+import re
+import asyncio
+from utils.helpers import create_embed, load_json_cached
+
+REPLIES_FILE = 'data/replies.json'
+# Seconds a change waits before it is written, so a burst of edits is saved once
+REPLIES_SAVE_DELAY = 0.5
+
+def _write_atomic(path: str, data: str) -> None:
+    """Write a file through a temporary copy, so readers never see it half written"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
 
 class Replies(commands.Cog):
     def __init__(self, bot):
@@ -12,23 +26,64 @@ class Replies(commands.Cog):
         # Initialize with default replies in the new format
         self.replies: Dict[str, dict] = {
         }
+        # One pattern matching any trigger, plus (position, lowered, trigger) entries
+        # grouped by first character; rebuilt on the next message after replies change
+        self._trigger_re: Optional[re.Pattern] = None
+        self._by_first: Dict[str, List[Tuple[int, str, str]]] = {}
+        # Pending save state: changes not yet written, the task that writes them,
+        # and an event that cuts its delay short on unload
+        self._dirty = False
+        self._save_task: Optional[asyncio.Task] = None
+        self._save_now = asyncio.Event()
         self.load_replies()
 
+    async def cog_unload(self):
+        """Write any change that is still waiting for its save delay"""
+        if self._save_task is not None and not self._save_task.done():
+            self._save_now.set()
+            await self._save_task
+
     def load_replies(self) -> None:
-        """Load custom replies from JSON file if it exists"""
+        """Load custom replies from JSON file if it exists, reusing the last parse if it is unchanged"""
         try:
-            if os.path.exists('data/replies.json'):
-                with open('data/replies.json', 'r') as f:
-                    self.replies.update(json.load(f))
+            if os.path.exists(REPLIES_FILE):
+                self.replies.update(load_json_cached(REPLIES_FILE))
         except Exception as e:
             print(f"Error loading replies: {e}")
+        self._trigger_re = None
+
+    def _compile_triggers(self) -> None:
+        """Build the any-trigger pattern and the first-character trigger buckets"""
+        self._by_first = {}
+        for position, trigger in enumerate(self.replies):
+            lowered = trigger.lower()
+            self._by_first.setdefault(lowered[:1], []).append((position, lowered, trigger))
+        self._trigger_re = re.compile("|".join(re.escape(trigger.lower()) for trigger in self.replies))
 
     def save_replies(self) -> None:
+        """Schedule a save of the custom replies, writing a burst of changes once"""
+        # Every change to the triggers is followed by a save
+        self._trigger_re = None
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            self._save_task = asyncio.create_task(self._save_later())
+
+    async def _save_later(self) -> None:
+        """Write the replies after REPLIES_SAVE_DELAY, again if they changed during the write"""
+        while self._dirty:
+            try:
+                await asyncio.wait_for(self._save_now.wait(), REPLIES_SAVE_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self._dirty = False
+            await self._write_replies()
+
+    async def _write_replies(self) -> None:
         """Save custom replies to JSON file"""
         try:
-            os.makedirs('data', exist_ok=True)
-            with open('data/replies.json', 'w') as f:
-                json.dump(self.replies, f, indent=4)
+            # Encoded here, so the thread never sees the dict while a command changes it
+            data = json.dumps(self.replies, indent=4)
+            await asyncio.to_thread(_write_atomic, REPLIES_FILE, data)
         except Exception as e:
             print(f"Error saving replies: {e}")
         
@@ -43,8 +98,22 @@ class Replies(commands.Cog):
             await message.channel.send("Whatever")
             return
         
-        for trigger, reply_data in self.replies.items():
-            if trigger.lower() in content:
+        if self._trigger_re is None:
+            self._compile_triggers()
+        # A single C-level sweep rejects the messages that contain no trigger at all
+        if not self.replies or not self._trigger_re.search(content):
+            return
+        
+        # Only triggers starting with a character of the message can match; an empty
+        # trigger matches everything, as before. Earlier triggers take priority
+        present = set(content)
+        present.add("")
+        candidates = sorted(
+            entry for char in present & self._by_first.keys() for entry in self._by_first[char]
+        )
+        for _, lowered, trigger in candidates:
+            if lowered in content:
+                reply_data = self.replies[trigger]
                 # Add reactions
                 if "reactions" in reply_data:
                     for reaction in reply_data["reactions"]:
@@ -3,8 +3,12 @@ import os
 import discord
 from discord.ext import commands
 import config
+from utils.ollama_handler import get_ollama_handler
 from dotenv import load_dotenv
 import asyncio
+import logging
+import logging.handlers
+import queue
 
 # Load environment variables
 load_dotenv()
@@ -20,6 +24,11 @@ class DiscordBot(commands.Bot):
     async def setup_hook(self):
         await load_extensions(self)
 
+    async def close(self):
+        # The Ollama session outlives cog reloads, so it is closed with the bot
+        await get_ollama_handler().close()
+        await super().close()
+
     async def on_ready(self):
         print(f'{self.user} has connected to Discord!')
         print(f'Bot is in {len(self.guilds)} guilds')
@@ -64,7 +73,6 @@ async def load_extensions(bot):
         if extension_path:
             try:
                 await bot.load_extension(extension_path)
-                await bot.load_extension("cogs.voice")
                 print(f"✅ Loaded extension: {extension_path}")
                 loaded_cogs += 1
             except Exception as e:
@@ -73,9 +81,26 @@ async def load_extensions(bot):
     
     print(f"Extension loading complete. Loaded: {loaded_cogs}, Failed: {failed_cogs}")
 
+def setup_logging() -> logging.handlers.QueueListener:
+    """Route log records through a queue so handler I/O happens off the event loop"""
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
 async def main():
+    listener = setup_logging()
     bot = DiscordBot()
-    await bot.start(os.getenv('DISCORD_TOKEN'))
+    try:
+        await bot.start(os.getenv('DISCORD_TOKEN'))
+    finally:
+        listener.stop()
 
 if __name__ == '__main__':
     asyncio.run(main())
\ No newline at end of file
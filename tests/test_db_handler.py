@@ -0,0 +1,64 @@
+# tests/test_db_handler.py
+import os
+import tempfile
+import unittest
+
+from utils.db_handler import DatabaseHandler
+
+USER_ID = 1
+
+class RerollLookupTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseHandler(os.path.join(self.tmp.name, "bot.db"))
+
+    def tearDown(self):
+        self.db.get_connection().close()
+        self.tmp.cleanup()
+
+    def total_success(self) -> int:
+        return self.db.get_success_stats(USER_ID)['total_success']
+
+    def roll(self, success_level: int):
+        """Mirror !успех: record the execution, then the roll made for it"""
+        execution_time = self.db.record_user_execution(USER_ID, "user", "успех")
+        self.db.record_success_roll(USER_ID, success_level, True)
+        return execution_time
+
+    def test_last_success_level_finds_roll_made_in_the_same_second(self):
+        execution_time = self.roll(4)
+        self.assertEqual(self.db.get_last_success_level(USER_ID, execution_time), 4)
+
+    def test_reroll_changes_total_by_the_difference(self):
+        execution_time = self.roll(2)
+        self.assertEqual(self.total_success(), 2)
+
+        # Mirror !reroll: take the previous roll back out, then roll again
+        prev_success = self.db.get_last_success_level(USER_ID, execution_time)
+        if prev_success is not None:
+            self.db.remove_total_success(USER_ID, prev_success)
+        self.db.record_success_roll(USER_ID, 5)
+        self.db.add_reroll_usage(USER_ID, execution_time)
+
+        self.assertEqual(self.total_success(), 5)
+
+    def test_last_success_level_ignores_rolls_before_the_execution(self):
+        self.db.record_success_roll(USER_ID, 3)
+        self.db.get_connection().execute(
+            "UPDATE command_usage SET used_at = datetime(used_at, '-1 hour')"
+        )
+        execution_time = self.db.record_user_execution(USER_ID, "user", "успех")
+        self.assertIsNone(self.db.get_last_success_level(USER_ID, execution_time))
+
+    def test_reroll_state_includes_the_roll_and_its_reroll_flag(self):
+        execution_time = self.roll(3)
+        state = self.db.get_reroll_state(USER_ID)
+        self.assertEqual(state['execution_time'], execution_time)
+        self.assertEqual(state['success_level'], 3)
+        self.assertFalse(state['rerolled'])
+
+        self.db.add_reroll_usage(USER_ID, execution_time)
+        self.assertTrue(self.db.get_reroll_state(USER_ID)['rerolled'])
+
+if __name__ == "__main__":
+    unittest.main()
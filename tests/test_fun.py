@@ -0,0 +1,75 @@
+# tests/test_fun.py
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from cogs.fun import Fun, SUCCESS_TABLE
+from utils.db_handler import DatabaseHandler
+
+USER_ID = 1
+
+class FakeRNG:
+    """Hands out preset numbers in place of Random.org"""
+    def __init__(self, *numbers: int):
+        self.numbers = list(numbers)
+
+    async def randint(self, min_val: int, max_val: int) -> int:
+        return self.numbers.pop(0)
+
+    async def close(self):
+        pass
+
+def level_of(number: int) -> int:
+    return SUCCESS_TABLE[number - 1][1]
+
+class RerollTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = DatabaseHandler(os.path.join(self.tmp.name, "bot.db"))
+        self.db.update_user(USER_ID, "user")
+        with self.db.get_connection() as conn:
+            conn.execute("UPDATE users SET has_reroll_ability = 1 WHERE user_id = ?", (USER_ID,))
+        self.ctx = mock.MagicMock()
+        self.ctx.author = SimpleNamespace(id=USER_ID, name="user", mention=f"<@{USER_ID}>")
+        self.ctx.defer = mock.AsyncMock()
+        self.ctx.send = mock.AsyncMock()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_cog(self, *numbers: int) -> Fun:
+        with mock.patch.dict(os.environ, {"RANDOM_ORG_KEY": "test"}), \
+                mock.patch("cogs.fun.get_db", return_value=self.db):
+            cog = Fun(mock.MagicMock())
+        cog.rng = FakeRNG(*numbers)
+        return cog
+
+    def total_success(self) -> int:
+        return self.db.get_success_stats(USER_ID)['total_success']
+
+    def last_reply(self) -> str:
+        return self.ctx.send.await_args.args[0]
+
+    async def test_reroll_from_active_check(self):
+        cog = self.make_cog(10, 95)
+        await Fun.success.callback(cog, self.ctx)
+        self.assertEqual(self.total_success(), level_of(10))
+
+        await Fun.reroll.callback(cog, self.ctx)
+        self.assertEqual(self.total_success(), level_of(95))
+
+    async def test_reroll_from_database_after_reload(self):
+        await Fun.success.callback(self.make_cog(10), self.ctx)
+
+        # A fresh cog has no active checks, so the roll is looked up in the database
+        await Fun.reroll.callback(self.make_cog(95), self.ctx)
+        self.assertEqual(self.total_success(), level_of(95))
+
+        await Fun.reroll.callback(self.make_cog(50), self.ctx)
+        self.assertIn("already used your reroll", self.last_reply())
+        self.assertEqual(self.total_success(), level_of(95))
+
+if __name__ == "__main__":
+    unittest.main()
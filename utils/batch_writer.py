@@ -0,0 +1,59 @@
+# utils/batch_writer.py
+import asyncio
+import logging
+from typing import Any, Callable, Optional
+
+from utils.db_handler import DatabaseHandler
+
+class BatchWriter:
+    """Queues rows in memory and writes them in the background, one DatabaseHandler call per batch"""
+    def __init__(self, db: DatabaseHandler, write: Callable[[list], Any], label: str,
+                 batch_size: int = 500, interval: float = 0.5, max_queued: int = 10_000):
+        self.db = db
+        self.write = write
+        self.label = label  # What the rows are, for log messages
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._flusher: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start writing queued rows in the background"""
+        self._flusher = asyncio.create_task(self._flush())
+
+    async def close(self) -> None:
+        """Stop the flusher and write whatever is still queued, so nothing is lost on reload"""
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        while not self._queue.empty():
+            await self.db.run(self.write, self._take_batch())
+
+    def put(self, row: Any) -> bool:
+        """Queue a row without waiting, returning False if the queue is full and it was dropped"""
+        try:
+            self._queue.put_nowait(row)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    def _take_batch(self) -> list:
+        """Take up to batch_size queued rows without waiting"""
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _flush(self):
+        """Write queued rows as they arrive, at most one batch per interval"""
+        while True:
+            batch = [await self._queue.get()]
+            batch.extend(self._take_batch())
+            try:
+                await self.db.run(self.write, batch)
+            except Exception:
+                logging.exception("Failed to write %d %s rows", len(batch), self.label)
+            await asyncio.sleep(self.interval)
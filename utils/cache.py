@@ -0,0 +1,94 @@
+# utils/cache.py
+import time
+from typing import Any, Dict, Hashable, Tuple
+
+_MISSING = object()
+
+class TTLCache:
+    """Small in-memory cache whose entries expire after a fixed number of seconds"""
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if it is missing or expired"""
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the oldest entry when full"""
+        if key not in self._data and len(self._data) >= self.maxsize:
+            self._data.pop(next(iter(self._data)))
+        self._data[key] = (time.monotonic() + self.ttl, value)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value if it had not expired"""
+        value = self.get(key, default)
+        self._data.pop(key, None)
+        return value
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._data.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+class LFUCache:
+    """In-memory cache that evicts its least frequently used entry when full"""
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: Dict[Hashable, Any] = {}
+        self._uses: Dict[Hashable, int] = {}
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if it is missing, counting the lookup"""
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._uses[key] += 1
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least used entry (oldest on ties) when full"""
+        if key not in self._data:
+            if len(self._data) >= self.maxsize:
+                victim = min(self._uses, key=self._uses.__getitem__)
+                del self._data[victim]
+                del self._uses[victim]
+            self._uses[key] = 0
+        self._data[key] = value
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """Remove an entry and return its value"""
+        self._uses.pop(key, None)
+        return self._data.pop(key, default)
+
+    def clear(self) -> None:
+        """Remove all entries"""
+        self._data.clear()
+        self._uses.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Return lookup hits, misses and the current number of entries"""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._data)}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
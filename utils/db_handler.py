@@ -1,9 +1,30 @@
 # utils/db_handler.py
 import sqlite3
+import asyncio
+import threading
 from datetime import datetime
-import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple, Callable
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from collections import Counter
+
+# Per-thread connection pool: each worker thread keeps one open connection per database
+_thread_connections = threading.local()
+
+# A small fixed set of threads for database calls, so each one's connection and
+# its prepared statement cache stay warm instead of being spread across the
+# default executor's threads
+_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="db")
+
+def _configure_connection(conn: sqlite3.Connection) -> sqlite3.Connection:
+    """Apply the row factory and pragmas used by every long-lived connection"""
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA cache_size=-64000')
+    return conn
 
 class DatabaseHandler:
     def __init__(self, db_path: str = "data/bot.db"):
@@ -13,18 +34,26 @@ class DatabaseHandler:
         self.init_database()
 
     def get_connection(self) -> sqlite3.Connection:
-        """Get a database connection with row factory"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
+        """Get the calling thread's pooled database connection, opening it on first use"""
+        connections = getattr(_thread_connections, 'connections', None)
+        if connections is None:
+            connections = _thread_connections.connections = {}
+        conn = connections.get(self.db_path)
+        if conn is None:
+            conn = _configure_connection(sqlite3.connect(self.db_path, cached_statements=128))
+            connections[self.db_path] = conn
         return conn
 
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run a blocking database call in a worker thread so the event loop stays responsive"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, partial(func, *args, **kwargs))
+
     def init_database(self) -> None:
         """Initialize database tables and add new columns if needed"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
             # First create the users table if it doesn't exist
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS users (
                     user_id INTEGER PRIMARY KEY,
                     username TEXT,
@@ -34,7 +63,7 @@ class DatabaseHandler:
             ''')
 
             # Check for and add new columns if they don't exist
-            cursor.execute('PRAGMA table_info(users)')
+            cursor = conn.execute('PRAGMA table_info(users)')
             existing_columns = {row['name'] for row in cursor.fetchall()}
 
             # Add new columns if they don't exist
@@ -48,12 +77,12 @@ class DatabaseHandler:
             for column, data_type in new_columns.items():
                 if column not in existing_columns:
                     try:
-                        cursor.execute(f'ALTER TABLE users ADD COLUMN {column} {data_type}')
+                        conn.execute(f'ALTER TABLE users ADD COLUMN {column} {data_type}')
                     except Exception as e:
                         print(f"Error adding column {column}: {e}")
 
             # Create command_usage table
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS command_usage (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
@@ -65,8 +94,18 @@ class DatabaseHandler:
                 )
             ''')
 
+            # Per-user lookups of command history (stats and leaderboard joins),
+            # and the latest roll since an execution for !reroll: a range scan on
+            # used_at, whose ORDER BY used_at DESC, id DESC the index already
+            # satisfies because id is the rowid it ends with
+            conn.execute('DROP INDEX IF EXISTS idx_command_usage_user_command')
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_command_usage_user_command_time
+                ON command_usage (user_id, command_name, used_at)
+            ''')
+
             # Create command_cooldowns table
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS command_cooldowns (
                     user_id INTEGER,
                     command_name TEXT,
@@ -77,7 +116,7 @@ class DatabaseHandler:
             ''')
             
             # Create word_usage table
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS word_usage (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
                     user_id INTEGER,
@@ -90,7 +129,7 @@ class DatabaseHandler:
             ''')
 
             # Create word_stats table
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS word_stats (
                     user_id INTEGER,
                     word TEXT,
@@ -101,8 +140,14 @@ class DatabaseHandler:
                 )
             ''')
 
+            # Top users for a single tracked word
+            conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_word_stats_word_count
+                ON word_stats (word, usage_count)
+            ''')
+
              # Create command_rerolls table to track reroll usage
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS command_rerolls (
                     user_id INTEGER,
                     command_time TIMESTAMP,
@@ -112,7 +157,7 @@ class DatabaseHandler:
                 )
             ''')
             # Create prompts table
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS prompts (
                     model_name TEXT PRIMARY KEY,
                     system_prompt TEXT NOT NULL,
@@ -123,7 +168,7 @@ class DatabaseHandler:
             ''')
 
             # Create command_executions table to track exact execution times
-            cursor.execute('''
+            conn.execute('''
                 CREATE TABLE IF NOT EXISTS command_executions (
                     user_id INTEGER,
                     command_name TEXT,
@@ -139,8 +184,7 @@ class DatabaseHandler:
     def get_prompt(self, model_name: str) -> Optional[str]:
         """Get the system prompt for a specific model"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
                 SELECT system_prompt
                 FROM prompts
                 WHERE model_name = ?
@@ -151,8 +195,7 @@ class DatabaseHandler:
     def set_prompt(self, model_name: str, system_prompt: str, updated_by: int) -> None:
         """Set or update the system prompt for a model"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            conn.execute('''
                 INSERT INTO prompts (model_name, system_prompt, updated_by, last_updated)
                 VALUES (?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(model_name) DO UPDATE SET
@@ -165,8 +208,7 @@ class DatabaseHandler:
     def get_prompt_history(self, model_name: str) -> List[Dict[str, Any]]:
         """Get prompt update history for a model"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
                 SELECT p.*, u.username as updated_by_name
                 FROM prompts p
                 LEFT JOIN users u ON p.updated_by = u.user_id
@@ -178,53 +220,31 @@ class DatabaseHandler:
     def add_reroll_usage(self, user_id: int, command_time: datetime) -> None:
         """Track that a user has used their reroll for a specific успех command"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            conn.execute('''
                 INSERT INTO command_rerolls (user_id, command_time, rerolled)
                 VALUES (?, ?, 1)
             ''', (user_id, command_time))
             conn.commit()
-
-    def has_rerolled(self, user_id: int, command_time: datetime) -> bool:
-        """Check if user has already rerolled for a specific успех command"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT rerolled FROM command_rerolls
-                WHERE user_id = ? AND command_time = ?
-            ''', (user_id, command_time))
-            result = cursor.fetchone()
-            return bool(result and result['rerolled'])
     
     def update_user(self, user_id: int, username: str) -> None:
         """Update or create user record"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO users (user_id, username, last_active)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    username = ?,
-                    last_active = CURRENT_TIMESTAMP
-            ''', (user_id, username, username))
-            conn.commit()
+            self._upsert_user(conn, user_id, username)
 
-    def unlock_reroll_ability(self, user_id: int) -> None:
-        """Unlock the reroll ability for a user"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                UPDATE users
-                SET has_reroll_ability = 1
-                WHERE user_id = ?
-            ''', (user_id,))
-            conn.commit()
+    def _upsert_user(self, conn: sqlite3.Connection, user_id: int, username: str) -> None:
+        """Create the user or refresh their name and activity time, without committing"""
+        conn.execute('''
+            INSERT INTO users (user_id, username, last_active)
+            VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(user_id) DO UPDATE SET
+                username = ?,
+                last_active = CURRENT_TIMESTAMP
+        ''', (user_id, username, username))
 
     def has_reroll_ability(self, user_id: int) -> bool:
         """Check if user has unlocked the reroll ability"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
                 SELECT has_reroll_ability
                 FROM users
                 WHERE user_id = ?
@@ -237,109 +257,145 @@ class DatabaseHandler:
                          roll_value: Optional[int] = None) -> None:
         """Log command usage with optional success level and roll value"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            conn.execute('''
                 INSERT INTO command_usage 
                 (user_id, command_name, success_level, roll_value)
                 VALUES (?, ?, ?, ?)
             ''', (user_id, command_name, success_level, roll_value))
             conn.commit()
 
-    def update_command_cooldown(self, user_id: int, command_name: str) -> None:
-        """Update command cooldown timestamp"""
+    def log_command_usages(self, rows: List[tuple]) -> None:
+        """Log a batch of (user_id, command_name, success_level, roll_value, used_at) rows"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO command_cooldowns (user_id, command_name, last_used)
-                VALUES (?, ?, CURRENT_TIMESTAMP)
-                ON CONFLICT(user_id, command_name) DO UPDATE SET
-                    last_used = CURRENT_TIMESTAMP
-            ''', (user_id, command_name))
-            conn.commit()
+            conn.executemany('''
+                INSERT INTO command_usage 
+                (user_id, command_name, success_level, roll_value, used_at)
+                VALUES (?, ?, ?, ?, ?)
+            ''', rows)
 
-    def get_command_cooldown(self, user_id: int, command_name: str) -> Optional[datetime]:
-        """Get last usage time for a command"""
+    def get_command_cooldown_epoch(self, user_id: int, command_name: str) -> Optional[int]:
+        """Get last usage time for a command as Unix epoch seconds"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT last_used FROM command_cooldowns
+            cursor = conn.execute('''
+                SELECT CAST(strftime('%s', last_used) AS INTEGER) AS last_used
+                FROM command_cooldowns
                 WHERE user_id = ? AND command_name = ?
             ''', (user_id, command_name))
             result = cursor.fetchone()
-            if result:
-                return datetime.fromisoformat(result['last_used'])
-            return None
+            return result['last_used'] if result else None
+
+    def get_last_success_level(self, user_id: int, since: datetime) -> Optional[int]:
+        """Get the success level of the user's latest успех roll made since the given time"""
+        with self.get_connection() as conn:
+            cursor = conn.execute('''
+                SELECT success_level
+                FROM command_usage
+                WHERE user_id = ? AND command_name = 'успех'
+                AND used_at >= ?
+                ORDER BY used_at DESC, id DESC
+                LIMIT 1
+            ''', (user_id, since))
+            result = cursor.fetchone()
+            return result['success_level'] if result else None
 
-    def update_total_success(self, user_id: int, success_level: int) -> None:
-        """Update user's total success score"""
+    def remove_total_success(self, user_id: int, amount: int) -> None:
+        """Subtract points from user's total success score"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            conn.execute('''
                 UPDATE users
-                SET total_success = COALESCE(total_success, 0) + ?
+                SET total_success = total_success - ?
                 WHERE user_id = ?
-            ''', (success_level, user_id))
+            ''', (amount, user_id))
             conn.commit()
 
-    def update_success_streak(self, user_id: int) -> Dict[str, Any]:
-        """Update user's success streak and return streak info"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
+    def _compute_success_streak(self, conn: sqlite3.Connection, user_id: int) -> Dict[str, Any]:
+        """Work out the user's new success streak from their last check"""
+        # Get user's last success check
+        cursor = conn.execute('''
+            SELECT last_success_check, success_streak
+            FROM users
+            WHERE user_id = ?
+        ''', (user_id,))
+        result = cursor.fetchone()
+        
+        current_time = datetime.now()
+        streak_info = {
+            'streak_continued': False,
+            'streak_reset': False,
+            'current_streak': 0
+        }
+        
+        if result and result['last_success_check']:
+            last_check = datetime.fromisoformat(result['last_success_check'])
+            current_streak = result['success_streak'] or 0  # Handle NULL value
             
-            # Get user's last success check
-            cursor.execute('''
-                SELECT last_success_check, success_streak
-                FROM users
-                WHERE user_id = ?
-            ''', (user_id,))
-            result = cursor.fetchone()
+            # Calculate days between checks
+            days_diff = (current_time.date() - last_check.date()).days
             
-            current_time = datetime.now()
-            streak_info = {
-                'streak_continued': False,
-                'streak_reset': False,
-                'current_streak': 0
-            }
-            
-            if result and result['last_success_check']:
-                last_check = datetime.fromisoformat(result['last_success_check'])
-                current_streak = result['success_streak'] or 0  # Handle NULL value
-                
-                # Calculate days between checks
-                days_diff = (current_time.date() - last_check.date()).days
-                
-                if days_diff == 1:
-                    # Streak continues
-                    current_streak += 1
-                    streak_info['streak_continued'] = True
-                elif days_diff == 0:
-                    # Already checked today, maintain streak
-                    pass
-                else:
-                    # Streak broken
-                    current_streak = 1
-                    streak_info['streak_reset'] = True
+            if days_diff == 1:
+                # Streak continues
+                current_streak += 1
+                streak_info['streak_continued'] = True
+            elif days_diff == 0:
+                # Already checked today, maintain streak
+                pass
             else:
-                # First time checking
+                # Streak broken
                 current_streak = 1
+                streak_info['streak_reset'] = True
+        else:
+            # First time checking
+            current_streak = 1
+        
+        streak_info['current_streak'] = current_streak
+        return streak_info
+
+    def record_success_roll(self, user_id: int, success_level: int,
+                            update_cooldown: bool = False) -> Dict[str, Any]:
+        """Record an успех roll in one transaction and return streak info.
+
+        Logs the roll, then updates total, streak, last check and (at a
+        continued 7 day streak) the reroll unlock with a single UPDATE.
+        Optionally also refreshes the command cooldown.
+        """
+        with self.get_connection() as conn:
+            conn.execute('''
+                INSERT INTO command_usage 
+                (user_id, command_name, success_level)
+                VALUES (?, 'успех', ?)
+            ''', (user_id, success_level))
+            
+            streak_info = self._compute_success_streak(conn, user_id)
+            streak_info['reroll_unlocked'] = (
+                streak_info['streak_continued'] and streak_info['current_streak'] == 7
+            )
             
-            # Update user's streak and last check time
-            cursor.execute('''
+            cursor = conn.execute('''
                 UPDATE users
-                SET success_streak = ?,
-                    last_success_check = CURRENT_TIMESTAMP
+                SET total_success = COALESCE(total_success, 0) + ?,
+                    success_streak = ?,
+                    last_success_check = CURRENT_TIMESTAMP,
+                    has_reroll_ability = CASE WHEN ? THEN 1 ELSE has_reroll_ability END
                 WHERE user_id = ?
-            ''', (current_streak, user_id))
+                RETURNING has_reroll_ability
+            ''', (success_level, streak_info['current_streak'],
+                  streak_info['reroll_unlocked'], user_id))
+            result = cursor.fetchone()
+            streak_info['has_reroll_ability'] = bool(result and result['has_reroll_ability'])
             
-            streak_info['current_streak'] = current_streak
-            conn.commit()
+            if update_cooldown:
+                conn.execute('''
+                    INSERT INTO command_cooldowns (user_id, command_name, last_used)
+                    VALUES (?, 'успех', CURRENT_TIMESTAMP)
+                    ON CONFLICT(user_id, command_name) DO UPDATE SET
+                        last_used = CURRENT_TIMESTAMP
+                ''', (user_id,))
             return streak_info
 
     def get_success_stats(self, user_id: int) -> Dict[str, Any]:
         """Get comprehensive success stats for a user"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
                 SELECT 
                     u.total_success,
                     u.success_streak,
@@ -370,65 +426,68 @@ class DatabaseHandler:
             }
 
     def get_success_leaderboard(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get leaderboard for успех command"""
+        """Get leaderboard for успех command.
+
+        Ranks by the running total_success kept on users, then aggregates
+        command_usage only for the top rows instead of for every user.
+        """
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
+                WITH top AS (
+                    SELECT 
+                        u.user_id,
+                        u.username,
+                        COALESCE(u.total_success, 0) as total_success,
+                        COALESCE(u.success_streak, 0) as success_streak,
+                        COALESCE(u.has_reroll_ability, 0) as has_reroll_ability
+                    FROM users u
+                    WHERE COALESCE(u.total_success, 0) > 0
+                        OR EXISTS (
+                            SELECT 1 FROM command_usage cu
+                            WHERE cu.user_id = u.user_id AND cu.command_name = 'успех'
+                        )
+                    ORDER BY total_success DESC, success_streak DESC
+                    LIMIT ?
+                )
                 SELECT 
-                    u.username,
-                    COALESCE(u.total_success, 0) as total_success,
-                    COALESCE(u.success_streak, 0) as success_streak,
-                    COALESCE(u.has_reroll_ability, 0) as has_reroll_ability,
-                    COUNT(DISTINCT cu.id) as total_attempts,
+                    t.username,
+                    t.total_success,
+                    t.success_streak,
+                    t.has_reroll_ability,
+                    COUNT(cu.id) as total_attempts,
                     COALESCE(MAX(cu.success_level), 0) as highest_success,
                     COALESCE(AVG(CAST(cu.success_level AS FLOAT)), 0) as avg_success
-                FROM users u
+                FROM top t
                 LEFT JOIN command_usage cu 
-                    ON u.user_id = cu.user_id 
+                    ON t.user_id = cu.user_id 
                     AND cu.command_name = 'успех'
-                WHERE COALESCE(u.total_success, 0) > 0 
-                    OR EXISTS (
-                        SELECT 1 
-                        FROM command_usage cu2 
-                        WHERE cu2.user_id = u.user_id 
-                        AND cu2.command_name = 'успех'
-                    )
-                GROUP BY u.user_id, u.username, u.total_success, u.success_streak, u.has_reroll_ability
-                ORDER BY COALESCE(u.total_success, 0) DESC, COALESCE(u.success_streak, 0) DESC
-                LIMIT ?
+                GROUP BY t.user_id
+                ORDER BY t.total_success DESC, t.success_streak DESC
             ''', (limit,))
             
             return [dict(row) for row in cursor.fetchall()]
 
-    def log_word_usage(self, user_id: int, word: str, 
-                      message_id: Optional[int] = None,
-                      channel_id: Optional[int] = None) -> None:
-        """Log usage of a tracked word"""
+    def log_word_usages(self, rows: List[Tuple[int, str]]) -> None:
+        """Log a batch of (user_id, word) tracked word uses in a single transaction"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
-            # Log individual usage
-            cursor.execute('''
-                INSERT INTO word_usage (user_id, word, message_id, channel_id)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, word, message_id, channel_id))
+            conn.executemany('''
+                INSERT INTO word_usage (user_id, word)
+                VALUES (?, ?)
+            ''', rows)
 
-            # Update stats
-            cursor.execute('''
+            # One upsert per distinct (user, word), adding all of its uses at once
+            conn.executemany('''
                 INSERT INTO word_stats (user_id, word, usage_count, last_used)
-                VALUES (?, ?, 1, CURRENT_TIMESTAMP)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(user_id, word) DO UPDATE SET
-                    usage_count = usage_count + 1,
+                    usage_count = usage_count + excluded.usage_count,
                     last_used = CURRENT_TIMESTAMP
-            ''', (user_id, word))
-            
-            conn.commit()
+            ''', [(user_id, word, uses) for (user_id, word), uses in Counter(rows).items()])
 
     def get_user_word_stats(self, user_id: int) -> List[Dict[str, Any]]:
         """Get word usage statistics for a user"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            cursor = conn.execute('''
                 SELECT 
                     word,
                     usage_count,
@@ -442,11 +501,9 @@ class DatabaseHandler:
     def get_word_leaderboard(self, word: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
         """Get leaderboard for word usage"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            
             if word:
                 # Leaderboard for specific word
-                cursor.execute('''
+                cursor = conn.execute('''
                     SELECT 
                         u.username,
                         ws.word,
@@ -460,7 +517,7 @@ class DatabaseHandler:
                 ''', (word, limit))
             else:
                 # Overall leaderboard
-                cursor.execute('''
+                cursor = conn.execute('''
                     SELECT 
                         u.username,
                         SUM(ws.usage_count) as total_count,
@@ -475,29 +532,59 @@ class DatabaseHandler:
             
             return [dict(row) for row in cursor.fetchall()]
 
-    def record_command_execution(self, user_id: int, command_name: str) -> datetime:
-        """Record the exact time a command was executed and return the timestamp"""
-        current_time = datetime.now()
+    def record_user_execution(self, user_id: int, username: str, command_name: str) -> datetime:
+        """Update the user record and record a command's execution time in one transaction.
+
+        The time is CURRENT_TIMESTAMP (UTC, whole seconds), the same clock and
+        format as command_usage.used_at, so the two compare correctly as text.
+        """
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
+            self._upsert_user(conn, user_id, username)
+            cursor = conn.execute('''
                 INSERT INTO command_executions (user_id, command_name, execution_time)
-                VALUES (?, ?, ?)
+                VALUES (?, ?, CURRENT_TIMESTAMP)
                 ON CONFLICT(user_id, command_name) DO UPDATE SET
-                    execution_time = ?
-            ''', (user_id, command_name, current_time, current_time))
-            conn.commit()
-        return current_time
+                    execution_time = excluded.execution_time
+                RETURNING execution_time
+            ''', (user_id, command_name))
+            return datetime.fromisoformat(cursor.fetchone()['execution_time'])
 
-    def get_command_execution_time(self, user_id: int, command_name: str) -> Optional[datetime]:
-        """Get the exact time a command was last executed"""
+    def get_reroll_state(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Get the latest успех check's time, whether it was rerolled and its roll, in one query"""
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT execution_time FROM command_executions
-                WHERE user_id = ? AND command_name = ?
-            ''', (user_id, command_name))
+            cursor = conn.execute('''
+                SELECT 
+                    ce.execution_time,
+                    COALESCE((
+                        SELECT cr.rerolled FROM command_rerolls cr
+                        WHERE cr.user_id = ce.user_id AND cr.command_time = ce.execution_time
+                    ), 0) as rerolled,
+                    (
+                        SELECT cu.success_level FROM command_usage cu
+                        WHERE cu.user_id = ce.user_id AND cu.command_name = 'успех'
+                        AND cu.used_at >= ce.execution_time
+                        ORDER BY cu.used_at DESC, cu.id DESC
+                        LIMIT 1
+                    ) as success_level
+                FROM command_executions ce
+                WHERE ce.user_id = ? AND ce.command_name = 'успех'
+            ''', (user_id,))
             result = cursor.fetchone()
-            if result:
-                return datetime.fromisoformat(result['execution_time'])
-            return None
\ No newline at end of file
+            if not result:
+                return None
+            return {
+                'execution_time': datetime.fromisoformat(result['execution_time']),
+                'rerolled': bool(result['rerolled']),
+                'success_level': result['success_level']
+            }
+
+
+# Shared handler, kept here so it survives cog reloads
+_db_instance: Optional[DatabaseHandler] = None
+
+def get_db() -> DatabaseHandler:
+    """Get the shared DatabaseHandler instance"""
+    global _db_instance
+    if _db_instance is None:
+        _db_instance = DatabaseHandler()
+    return _db_instance
@@ -1,5 +1,7 @@
 # utils/helpers.py
-from typing import Optional
+from typing import Optional, Any, Dict, Tuple
+import json
+import os
 import discord
 
 def create_embed(
@@ -13,4 +15,19 @@ def create_embed(
         description=description,
         color=color
     )
-    return embed
\ No newline at end of file
+    return embed
+
+# Parsed JSON files by path, with the mtime they were read at; kept here so it survives cog reloads
+_json_files: Dict[str, Tuple[float, Any]] = {}
+
+def load_json_cached(path: str) -> Any:
+    """Parse a JSON file, reusing the previous result while its mtime is unchanged.
+
+    The result is shared between calls, so copy it before changing it.
+    """
+    mtime = os.stat(path).st_mtime
+    cached = _json_files.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'r') as f:
+            cached = _json_files[path] = (mtime, json.load(f))
+    return cached[1]
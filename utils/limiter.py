@@ -0,0 +1,99 @@
+# utils/limiter.py
+import asyncio
+import time
+from collections import deque
+from typing import Deque, Optional
+
+class AIMDLimiter:
+    """Concurrency limit that creeps up while requests are fast and halves when they are slow or fail"""
+    def __init__(self, min_limit: int = 1, max_limit: int = 8,
+                 latency_target: float = 30.0, step: float = 0.5, window: int = 32):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.step = step
+        self.limit = float(max_limit)
+        self.in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    async def acquire(self):
+        """Wait until a request may start"""
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.cancel()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, latency: float, ok: bool):
+        """Finish a request, adjusting the limit by how it went"""
+        self.in_flight -= 1
+        self._latencies.append(latency)
+        average = sum(self._latencies) / len(self._latencies)
+        if ok and average <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + self.step)
+        else:
+            self.limit = max(self.min_limit, self.limit * 0.5)
+            # Judge the new limit on its own latencies
+            self._latencies.clear()
+        self._wake()
+
+    def cancel(self):
+        """Finish a request that was abandoned, without adjusting the limit"""
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+class CircuitBreaker:
+    """Stops requests after repeated failures, letting one through per reset_timeout to probe recovery"""
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def retry_in(self) -> float:
+        """Seconds until the next request is let through"""
+        if self._opened_at is None:
+            return 0.0
+        return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a request may go out now"""
+        if self._opened_at is None:
+            return True
+        now = time.monotonic()
+        if now - self._opened_at < self.reset_timeout:
+            return False
+        # Let this request probe; the rest wait for its outcome or the next window
+        self._opened_at = now
+        return True
+
+    def record(self, ok: bool):
+        """Count the outcome of a request that was allowed"""
+        if ok:
+            self.failures = 0
+            self._opened_at = None
+        else:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
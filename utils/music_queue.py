@@ -331,7 +331,7 @@ class QueueManager:
         """Get the current loop mode for a guild"""
         return self.loop_mode.get(guild_id, 0)
     
-    async def start_inactivity_timer(self, guild_id: int, voice_client: discord.VoiceClient) -> None:
+    def start_inactivity_timer(self, guild_id: int, voice_client: discord.VoiceClient) -> None:
         """Start the inactivity timer for a guild"""
         # Cancel existing timer if any
         self.cancel_inactivity_timer(guild_id)
@@ -425,9 +425,9 @@ class QueueManager:
                             await self._notify_track_start(guild_id, refreshed_track)
                         except Exception as retry_error:
                             logging.error(f"Error on retry: {retry_error}")
-                            await self.start_inactivity_timer(guild_id, voice_client)
+                            self.start_inactivity_timer(guild_id, voice_client)
                 else:
                     logging.info(f"[Guild {guild_id}] No more tracks in queue, starting inactivity timer")
-                    await self.start_inactivity_timer(guild_id, voice_client)
+                    self.start_inactivity_timer(guild_id, voice_client)
         else:
             logging.warning(f"[Guild {guild_id}] Track finished handler already running, skipping")
\ No newline at end of file
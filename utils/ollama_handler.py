@@ -1,12 +1,22 @@
 # utils/ollama_handler.py
 import aiohttp
-from typing import Optional, Dict, List, Any
-from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Any, AsyncIterator, NamedTuple
 from collections import deque
 import logging
+import json
+import hashlib
 import asyncio
 import time
 from dataclasses import dataclass
+from utils.cache import LFUCache
+from utils.limiter import AIMDLimiter, CircuitBreaker
+
+# Generated text beyond this many characters is cut off and marked
+MAX_RESPONSE_CHARS = 4000
+TRUNCATION_NOTE = "... [truncated due to length]"
+
+# Completed requests kept for get_metrics; older ones are dropped as new ones arrive
+MAX_METRICS = 5000
 
 @dataclass
 class RequestMetrics:
@@ -25,19 +35,21 @@ class RequestMetrics:
         self.error = error
         self.latency = self.end_time - self.start_time
 
-class Message:
-    """Class representing a conversation message"""
-    def __init__(self, role: str, content: str):
-        self.role = role
-        self.content = content
-        self.timestamp = datetime.now()
+@dataclass(slots=True)
+class LLMResult:
+    """Outcome of a generation: the reply text, or the error that prevented one"""
+    ok: bool
+    text: str = ""
+    error: Optional[str] = None
 
-    def to_dict(self) -> Dict[str, str]:
-        """Convert message to chat template format"""
-        return {
-            "role": self.role,
-            "content": self.content
-        }
+class OllamaError(Exception):
+    """Raised by stream_response when no reply could be generated"""
+
+class Message(NamedTuple):
+    """A conversation message and when it was added (epoch seconds)"""
+    role: str
+    content: str
+    timestamp: float
 
 class ModelConfig:
     """Configuration class for different models"""
@@ -49,6 +61,17 @@ class ModelConfig:
         self.stop_sequences = kwargs.get('stop', ["User:", "Assistant:"])
         self.max_tokens = kwargs.get('max_tokens', 4096)
         self.timeout = kwargs.get('timeout', 60)
+        # How long Ollama keeps the model loaded after a request (its default is 5m)
+        self.keep_alive = kwargs.get('keep_alive', '30m')
+        # Reuse earlier replies to identical prompts; disable to keep sampling every reply
+        self.cache_responses = kwargs.get('cache_responses', True)
+        # Request options are fixed per model, so build them once
+        self.options = {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "num_predict": self.num_predict,
+            "stop": self.stop_sequences
+        }
 
 class OllamaHandler:
     def __init__(self, base_url: str = "http://ollama:11434", 
@@ -59,10 +82,18 @@ class OllamaHandler:
         self.cleanup_interval = cleanup_interval
         self.conversation_history: Dict[int, Dict[str, deque[Message]]] = {}
         self.model_configs: Dict[str, ModelConfig] = {}
-        self.metrics: List[RequestMetrics] = []
+        self.metrics: deque[RequestMetrics] = deque(maxlen=MAX_METRICS)
         self._session: Optional[aiohttp.ClientSession] = None
         self._lock = asyncio.Lock()
-        self._last_cleanup = datetime.now()
+        self._last_cleanup = time.time()
+        # Replies by exact prompt. The prompt includes the conversation so far,
+        # so a hit only happens when model, history and message all match.
+        # Repeated prompts ("help", "ping") are the ones worth keeping, hence LFU
+        self.response_cache = LFUCache(maxsize=2048)
+        # Requests to Ollama across all users; the limit shrinks while it is slow
+        # or failing, and the breaker stops requests while it is down
+        self.limiter = AIMDLimiter(max_limit=8, latency_target=30.0)
+        self.breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30.0)
 
     def register_model(self, config: ModelConfig):
         """Register a model configuration"""
@@ -71,7 +102,10 @@ class OllamaHandler:
     async def get_session(self) -> aiohttp.ClientSession:
         """Get or create an aiohttp session"""
         if self._session is None or self._session.closed:
-            self._session = aiohttp.ClientSession()
+            # Keep idle connections to Ollama open longer than aiohttp's 15s
+            # default, since chat requests are often further apart than that
+            connector = aiohttp.TCPConnector(limit=20, keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector)
         return self._session
 
     async def close(self):
@@ -82,41 +116,47 @@ class OllamaHandler:
 
     def add_to_history(self, user_id: int, model: str, role: str, content: str):
         """Add a message to the conversation history for specific user and model"""
-        if user_id not in self.conversation_history:
-            self.conversation_history[user_id] = {}
-            
-        if model not in self.conversation_history[user_id]:
-            self.conversation_history[user_id][model] = deque(maxlen=self.max_context_messages)
-        
-        self.conversation_history[user_id][model].append(Message(role, content))
+        user_history = self.conversation_history.setdefault(user_id, {})
+        model_history = user_history.get(model)
+        if model_history is None:
+            model_history = user_history[model] = deque(maxlen=self.max_context_messages)
+        model_history.append(Message(role, content, time.time()))
 
     def clear_history(self, user_id: int, model: Optional[str] = None):
         """Clear conversation history for a user, optionally for specific model only"""
-        if user_id in self.conversation_history:
-            if model is None:
-                self.conversation_history[user_id].clear()
-            elif model in self.conversation_history[user_id]:
-                self.conversation_history[user_id][model].clear()
+        if model is None:
+            self.conversation_history.pop(user_id, None)
+            return
+
+        user_history = self.conversation_history.get(user_id)
+        if user_history is not None:
+            user_history.pop(model, None)
+            if not user_history:
+                del self.conversation_history[user_id]
 
     def get_history(self, user_id: int, model: Optional[str] = None) -> List[Dict[str, str]]:
         """Get conversation history for a user, optionally for specific model only"""
-        if user_id not in self.conversation_history:
+        user_history = self.conversation_history.get(user_id)
+        if not user_history:
             return []
             
         if model is None:
-            all_history = []
-            for model_history in self.conversation_history[user_id].values():
-                all_history.extend([msg.to_dict() for msg in model_history])
-            return all_history
-        
-        if model in self.conversation_history[user_id]:
-            return [msg.to_dict() for msg in self.conversation_history[user_id][model]]
-        return []
+            histories = user_history.values()
+        elif model in user_history:
+            histories = (user_history[model],)
+        else:
+            return []
+        return [
+            {"role": msg.role, "content": msg.content}
+            for model_history in histories
+            for msg in model_history
+        ]
 
     def cleanup_old_conversations(self):
         """Clean up old conversations based on cleanup interval"""
-        current_time = datetime.now()
-        if (current_time - self._last_cleanup).total_seconds() < self.cleanup_interval * 3600:
+        current_time = time.time()
+        max_age = self.cleanup_interval * 3600
+        if current_time - self._last_cleanup < max_age:
             return
 
         for user_id in list(self.conversation_history.keys()):
@@ -124,7 +164,7 @@ class OllamaHandler:
                 if not self.conversation_history[user_id][model]:
                     continue
                 oldest_message = self.conversation_history[user_id][model][0]
-                if current_time - oldest_message.timestamp > timedelta(hours=self.cleanup_interval):
+                if current_time - oldest_message.timestamp > max_age:
                     del self.conversation_history[user_id][model]
             
             if not self.conversation_history[user_id]:
@@ -134,50 +174,185 @@ class OllamaHandler:
 
     def _format_prompt(self, user_id: int, model: str, message: str) -> str:
         """Format the prompt with conversation history for specific model"""
-        prompt = ""
-        
-        if user_id in self.conversation_history and model in self.conversation_history[user_id]:
-            for msg in self.conversation_history[user_id][model]:
-                if msg.role == "user":
-                    prompt += f"User: {msg.content}\n"
-                else:
-                    prompt += f"Assistant: {msg.content}\n"
-        
-        prompt += f"User: {message}\n"
-        prompt += "Assistant:"
+        history = self.conversation_history.get(user_id, {}).get(model, ())
+        parts = [
+            f"User: {msg.content}\n" if msg.role == "user" else f"Assistant: {msg.content}\n"
+            for msg in history
+        ]
+        parts.append(f"User: {message}\nAssistant:")
+        return "".join(parts)
+
+    def _get_model_config(self, model: str) -> ModelConfig:
+        """Get a model's config, registering defaults for unknown models so they are built once"""
+        model_config = self.model_configs.get(model)
+        if model_config is None:
+            model_config = ModelConfig(model)
+            self.register_model(model_config)
+        return model_config
+
+    def _build_payload(self, user_id: int, model: str, message: str,
+                       model_config: ModelConfig) -> Dict[str, Any]:
+        """Build the /api/generate request body"""
+        return {
+            "model": model,
+            "prompt": self._format_prompt(user_id, model, message),
+            "stream": True,
+            "options": model_config.options,
+            "keep_alive": model_config.keep_alive
+        }
+
+    @staticmethod
+    def _cache_key(model: str, prompt: str) -> tuple:
+        """Key a response by model and full prompt; hashed, since prompts carry whole histories"""
+        return model, hashlib.sha1(prompt.encode()).digest()
+
+    def has_cached_response(self, user_id: int, message: str, model: str) -> bool:
+        """Whether the next reply to this message would come from the response cache"""
+        model_config = self.model_configs.get(model)
+        if model_config is not None and not model_config.cache_responses:
+            return False
+        return self._cache_key(model, self._format_prompt(user_id, model, message)) in self.response_cache
+
+    def _record_exchange(self, user_id: int, model: str, message: str,
+                         generated_text: str, metrics: RequestMetrics):
+        """Add a completed exchange to the history and record its metrics"""
+        self.add_to_history(user_id, model, "user", message)
+        self.add_to_history(user_id, model, "assistant", generated_text)
         
-        return prompt
+        metrics.complete(True)
+        metrics.tokens_generated = len(generated_text.split())
+        self.metrics.append(metrics)
+
+    def _record_failure(self, metrics: RequestMetrics, error_msg: str):
+        """Record the metrics of a request that produced no reply"""
+        metrics.complete(False, error_msg)
+        self.metrics.append(metrics)
+
+    def _reject(self, metrics: RequestMetrics) -> str:
+        """Record and describe a request turned away by the open circuit breaker"""
+        error_msg = f"Ollama is not responding, try again in {self.breaker.retry_in():.0f} seconds"
+        self._record_failure(metrics, error_msg)
+        return error_msg
+
+    def _finish_request(self, metrics: RequestMetrics, latency: float):
+        """Report a request's outcome to the limiter and circuit breaker"""
+        if not metrics.end_time:
+            # Abandoned before completing, which says nothing about Ollama
+            self.limiter.cancel()
+            return
+        self.limiter.release(latency, metrics.success)
+        self.breaker.record(metrics.success)
+
+    async def generate_response(self, user_id: int, message: str, model: str) -> LLMResult:
+        """Generate a response using Ollama with retry logic.
 
-    async def generate_response(self, user_id: int, message: str, model: str) -> str:
-        """Generate a response using Ollama with retry logic"""
+        Ollama is streamed from and the pieces joined, so the limiter sees the
+        time to the first text here too, as it does for stream_response.
+        """
         metrics = RequestMetrics(start_time=time.time(), model_name=model)
-        max_retries = 3
-        retry_delay = 1
 
         # Clean up old conversations periodically
         self.cleanup_old_conversations()
 
-        # Get model config
-        model_config = self.model_configs.get(model, ModelConfig(model))
+        model_config = self._get_model_config(model)
+        
+        # The prompt does not change between retries
+        payload = self._build_payload(user_id, model, message, model_config)
+        cache_key = self._cache_key(model, payload["prompt"])
+        cached = self.response_cache.get(cache_key) if model_config.cache_responses else None
+        if cached is not None:
+            self._record_exchange(user_id, model, message, cached, metrics)
+            return LLMResult(True, cached)
+        if not self.breaker.allow():
+            return LLMResult(False, error=self._reject(metrics))
+        
+        parts: List[str] = []
+        pieces = self._limited_stream(user_id, message, model, model_config,
+                                      payload, cache_key, metrics)
+        try:
+            async for piece in pieces:
+                parts.append(piece)
+        finally:
+            await pieces.aclose()
+        if not metrics.success:
+            return LLMResult(False, error=metrics.error)
+        return LLMResult(True, "".join(parts).strip())
+
+    async def stream_response(self, user_id: int, message: str, model: str) -> AsyncIterator[str]:
+        """Generate a response like generate_response, yielding text as Ollama produces it.
+
+        Failures before any text arrives are retried, then raised as an
+        OllamaError. A failure mid-stream ends the stream early and the
+        exchange is left out of the history.
+        """
+        metrics = RequestMetrics(start_time=time.time(), model_name=model)
+        self.cleanup_old_conversations()
+        model_config = self._get_model_config(model)
+        payload = self._build_payload(user_id, model, message, model_config)
+        cache_key = self._cache_key(model, payload["prompt"])
+        cached = self.response_cache.get(cache_key) if model_config.cache_responses else None
+        if cached is not None:
+            self._record_exchange(user_id, model, message, cached, metrics)
+            yield cached
+            return
+        if not self.breaker.allow():
+            raise OllamaError(self._reject(metrics))
+        
+        received_text = False
+        pieces = self._limited_stream(user_id, message, model, model_config,
+                                      payload, cache_key, metrics)
+        try:
+            async for piece in pieces:
+                received_text = True
+                yield piece
+        finally:
+            await pieces.aclose()
+        if not received_text and not metrics.success:
+            raise OllamaError(metrics.error)
+
+    async def _limited_stream(self, user_id: int, message: str, model: str,
+                              model_config: ModelConfig, payload: Dict[str, Any],
+                              cache_key: tuple, metrics: RequestMetrics) -> AsyncIterator[str]:
+        """Run _request_stream within the limiter, reporting the time to the first text.
+
+        That is what queueing in Ollama delays. Unlike the full generation time,
+        it does not grow with the length of a healthy reply.
+        """
+        first_text_latency = None
+        pieces = self._request_stream(user_id, message, model, model_config,
+                                      payload, cache_key, metrics)
+        await self.limiter.acquire()
+        # Timed from here, so waiting in the limiter does not count as Ollama latency
+        started = time.monotonic()
+        try:
+            async for piece in pieces:
+                if first_text_latency is None:
+                    first_text_latency = time.monotonic() - started
+                yield piece
+        finally:
+            await pieces.aclose()
+            latency = first_text_latency
+            if latency is None:
+                latency = time.monotonic() - started
+            self._finish_request(metrics, latency)
+
+    async def _request_stream(self, user_id: int, message: str, model: str,
+                              model_config: ModelConfig, payload: Dict[str, Any],
+                              cache_key: tuple, metrics: RequestMetrics) -> AsyncIterator[str]:
+        """Send a prepared streamed request, retrying failures before the first text.
+
+        Failures are left in metrics rather than raised, for stream_response to report.
+        """
+        max_retries = 3
+        retry_delay = 1
+        timeout = aiohttp.ClientTimeout(total=model_config.timeout)
         
+        parts: List[str] = []
+        length = 0
         for attempt in range(max_retries):
             try:
-                prompt = self._format_prompt(user_id, model, message)
                 session = await self.get_session()
                 
-                payload = {
-                    "model": model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": model_config.temperature,
-                        "top_p": model_config.top_p,
-                        "num_predict": model_config.num_predict,
-                        "stop": model_config.stop_sequences
-                    }
-                }
-                
-                timeout = aiohttp.ClientTimeout(total=model_config.timeout)
                 async with session.post(
                     f"{self.base_url}/api/generate",
                     json=payload,
@@ -190,54 +365,50 @@ class OllamaHandler:
                         if attempt < max_retries - 1:
                             await asyncio.sleep(retry_delay * (2 ** attempt))
                             continue
-                        metrics.complete(False, error_msg)
-                        self.metrics.append(metrics)
-                        return f"Error: {error_msg}"
-                    
-                    result = await response.json()
-                    if "response" in result:
-                        generated_text = result["response"].strip()
-                        
-                        if len(generated_text) > 4000:
-                            generated_text = generated_text[:4000] + "... [truncated due to length]"
-                        
-                        if not generated_text or generated_text.isspace():
-                            error_msg = "Model returned an empty response"
-                            metrics.complete(False, error_msg)
-                            self.metrics.append(metrics)
-                            return f"Error: {error_msg}"
-                        
-                        self.add_to_history(user_id, model, "user", message)
-                        self.add_to_history(user_id, model, "assistant", generated_text)
-                        
-                        metrics.complete(True)
-                        metrics.tokens_generated = len(generated_text.split())
-                        self.metrics.append(metrics)
-                        
-                        return generated_text
-                    
-                    error_msg = f"Unexpected API response format: {str(result)}"
-                    metrics.complete(False, error_msg)
-                    self.metrics.append(metrics)
-                    return f"Error: {error_msg}"
+                        self._record_failure(metrics, error_msg)
+                        return
                     
-            except asyncio.TimeoutError:
-                error_msg = f"Request timed out after {model_config.timeout} seconds"
-                if attempt < max_retries - 1:
-                    await asyncio.sleep(retry_delay * (2 ** attempt))
-                    continue
-                metrics.complete(False, error_msg)
-                self.metrics.append(metrics)
-                return f"Error: {error_msg}"
+                    # Ollama streams one JSON object per line until "done"
+                    async for line in response.content:
+                        if not line.strip():
+                            continue
+                        chunk = json.loads(line)
+                        piece = chunk.get("response", "")
+                        # Leading whitespace is dropped, as generate_response strips it
+                        if not parts:
+                            piece = piece.lstrip()
+                        if piece:
+                            if length + len(piece) > MAX_RESPONSE_CHARS:
+                                piece = piece[:MAX_RESPONSE_CHARS - length] + TRUNCATION_NOTE
+                                parts.append(piece)
+                                yield piece
+                                break
+                            parts.append(piece)
+                            length += len(piece)
+                            yield piece
+                        if chunk.get("done"):
+                            break
+                break
             except Exception as e:
-                error_msg = f"{type(e).__name__}: {str(e)}"
-                if attempt < max_retries - 1:
+                if isinstance(e, asyncio.TimeoutError):
+                    error_msg = f"Request timed out after {model_config.timeout} seconds"
+                else:
+                    error_msg = f"{type(e).__name__}: {str(e)}"
+                logging.error(f"Ollama stream error: {error_msg}")
+                if not parts and attempt < max_retries - 1:
                     await asyncio.sleep(retry_delay * (2 ** attempt))
                     continue
-                metrics.complete(False, error_msg)
-                self.metrics.append(metrics)
-                return f"Error: {error_msg}"
-            
+                self._record_failure(metrics, error_msg)
+                return
+
+        generated_text = "".join(parts).strip()
+        if not generated_text:
+            self._record_failure(metrics, "Model returned an empty response")
+            return
+
+        if model_config.cache_responses:
+            self.response_cache.set(cache_key, generated_text)
+        self._record_exchange(user_id, model, message, generated_text, metrics)
     
     def get_metrics(self, minutes: int = 60) -> Dict[str, Any]:
         """Get metrics for the last n minutes"""
@@ -262,4 +433,14 @@ class OllamaHandler:
             "average_latency": sum(m.latency for m in recent_metrics) / len(recent_metrics),
             "total_tokens": sum(m.tokens_generated for m in recent_metrics),
             "errors": [m.error for m in recent_metrics if m.error]
-        }
\ No newline at end of file
+        }
+
+# Shared handler instance, kept here so it survives reloads of the LLM cog
+_handler_instance = None
+
+def get_ollama_handler(base_url: str = "http://ollama:11434") -> OllamaHandler:
+    """Get the shared OllamaHandler instance"""
+    global _handler_instance
+    if _handler_instance is None:
+        _handler_instance = OllamaHandler(base_url=base_url)
+    return _handler_instance
@@ -105,7 +105,7 @@ class PlayerUIHelper:
             raise
 
     @staticmethod
-    async def chunk_text(text: str, chunk_size: int = 1900):
+    def chunk_text(text: str, chunk_size: int = 1900):
         """Split text into chunks while preserving word boundaries"""
         chunks = []
         current_chunk = ""
@@ -2,16 +2,27 @@
 import aiohttp
 import asyncio
 import secrets  # Fallback for errors
-from typing import Optional, List
+from collections import deque
+from typing import Optional, List, Dict, Tuple
 import logging
 
 class RandomOrgRNG:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, batch_size: int = 100, low_water: int = 20,
+                 prefetch_ranges: Tuple[Tuple[int, int], ...] = ((1, 100),)):
         self.api_key = api_key
         self.base_url = "https://api.random.org/json-rpc/4/invoke"
         self.remaining_bits = None
         self._session = None
         self._lock = asyncio.Lock()
+        # Prefetched numbers for the fixed ranges drawn from all the time (the
+        # !успех roll), refilled in batches. Any other range, like the ones
+        # users pick for !roll, is fetched one number at a time so no quota is
+        # spent on numbers that would never be drawn
+        self.batch_size = batch_size
+        self.low_water = low_water
+        self._buffers: Dict[Tuple[int, int], deque] = {key: deque() for key in prefetch_ranges}
+        self._refill_lock = asyncio.Lock()
+        self._refill_tasks: Dict[Tuple[int, int], asyncio.Task] = {}
 
     async def _get_session(self) -> aiohttp.ClientSession:
         """Get or create aiohttp session"""
@@ -63,12 +74,48 @@ class RandomOrgRNG:
                 return result["random"]["data"]
             return None
 
+    async def _refill(self, buffer: deque, min_val: int, max_val: int) -> None:
+        """Fetch a batch of numbers into a range's buffer unless it is already stocked.
+
+        The caller passes the buffer it holds, so the numbers always land in the
+        deque it is waiting on rather than one looked up again after the await.
+        """
+        async with self._refill_lock:
+            if len(buffer) >= self.low_water:
+                return
+            numbers = await self._get_integers(self.batch_size, min_val, max_val)
+            if numbers:
+                buffer.extend(numbers)
+
+    def _schedule_refill(self, buffer: deque, min_val: int, max_val: int) -> None:
+        """Top up a range's buffer in the background so callers don't wait"""
+        key = (min_val, max_val)
+        task = self._refill_tasks.get(key)
+        if task is None or task.done():
+            self._refill_tasks[key] = task = asyncio.create_task(self._refill(buffer, min_val, max_val))
+            task.add_done_callback(lambda done: self._forget_refill(key, done))
+
+    def _forget_refill(self, key: Tuple[int, int], task: asyncio.Task) -> None:
+        """Drop a finished refill task, unless a newer one has replaced it"""
+        if self._refill_tasks.get(key) is task:
+            del self._refill_tasks[key]
+
     async def randint(self, min_val: int, max_val: int) -> int:
         """Get a random integer between min_val and max_val (inclusive)"""
         try:
-            numbers = await self._get_integers(1, min_val, max_val)
-            if numbers:
-                return numbers[0]
+            buffer = self._buffers.get((min_val, max_val))
+            if buffer is None:
+                numbers = await self._get_integers(1, min_val, max_val)
+                if numbers:
+                    return numbers[0]
+            else:
+                if not buffer:
+                    await self._refill(buffer, min_val, max_val)
+                if buffer:
+                    number = buffer.popleft()
+                    if len(buffer) < self.low_water:
+                        self._schedule_refill(buffer, min_val, max_val)
+                    return number
         except Exception as e:
             logging.error(f"Failed to get random number from Random.org: {e}")
         
@@ -77,7 +124,10 @@ class RandomOrgRNG:
         return min_val + secrets.randbelow(range_size)
 
     async def close(self):
-        """Close the aiohttp session"""
+        """Cancel pending refills and close the aiohttp session"""
+        for task in self._refill_tasks.values():
+            task.cancel()
+        self._refill_tasks.clear()
         if self._session and not self._session.closed:
             await self._session.close()
 
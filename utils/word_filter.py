@@ -52,10 +52,8 @@ class WordFilter:
 
     def check_message(self, message: str) -> List[str]:
         """Check a message for bad words and return list of found words"""
-        message = message.lower()
-        words = message.split()
-        found_words = []
-        for word in words:
-            if word in self.bad_words:
-                found_words.append(word)
-        return found_words
\ No newline at end of file
+        words = message.lower().split()
+        # Most messages contain none, and isdisjoint rejects them without a Python-level loop
+        if self.bad_words.isdisjoint(words):
+            return []
+        return [word for word in words if word in self.bad_words]